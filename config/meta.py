@@ -3,4 +3,12 @@ PROJECT_NAME = ''
 GET_STARTED = "Create or Edit Analysis"
 
 ANALYSIS_STORE = 'filestore'
+CHANNEL_CACHE_BYTES = 2 * 1024**3
+EDF_BACKEND = 'mne'
+EPOCH_N_JOBS = None
+FILTER_CACHE_BYTES = 2 * 1024**3
+# persisting filtered signals to the analysis has no disk budget, each costs as much as its channel
+FILTER_CACHE_SPILL = False
+KEEP_PSD = False
+UPLOAD_BLOCK_BYTES = 64 * 1024**2
 __PAPER_LINK = ''
\ No newline at end of file
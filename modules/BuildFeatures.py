@@ -1,13 +1,21 @@
 import streamlit as st
 import os
+import json
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import modules.instructions as instruct
 from modules.ConfigureSession import SessionConfig
 from utils.EDF.EDF import EDFutils, Channel
 from utils.EDF.Epoch import Epoch
 from utils.EDF.SpectralDensity import SpectralDensity
 from utils.PlottingUtils import PlottingUtils
+from utils.EDF.FilterCache import FilterCache
+from utils.EDF.EpochPool import EpochPool
+from utils.EDF.RPeaks import RPeakDetector
+from utils.EDF.BuildContext import BuildContext
+from config.meta import CHANNEL_CACHE_BYTES, EDF_BACKEND, EPOCH_N_JOBS, FILTER_CACHE_BYTES, FILTER_CACHE_SPILL, KEEP_PSD
 
 
 class BuildFeatures(SessionConfig, PlottingUtils):
@@ -16,30 +24,81 @@ class BuildFeatures(SessionConfig, PlottingUtils):
         self.build_config = build_config
         self.derivand_store = {}
         self.feature_store_name = 'feature_store'
+        self.channel_cache_bytes = CHANNEL_CACHE_BYTES
+        self.filter_cache_bytes = FILTER_CACHE_BYTES
+        self.filter_cache_spill = FILTER_CACHE_SPILL
+        # worker processes for Epoch features, None uses every core
+        self.epoch_n_jobs = EPOCH_N_JOBS
+        # keep Welch PSD matrices after the features derived from them are computed
+        self.keep_psd = KEEP_PSD
 
     def execute_all_commands(self):
         edf = EDFutils(
             self.get_edf_from_analysis(self.analysis, path=True),
             fetch_metadata=False,
-            config=self.get_edfconfig() 
+            config=self.get_edfconfig(),
+            cache_bytes=self.channel_cache_bytes,
+            backend=EDF_BACKEND
         )
+        # caches and workers of this build only, concurrent sessions build with their own
+        epoch_pool = EpochPool(n_jobs=self.epoch_n_jobs)
+        context = BuildContext(
+            filter_cache=FilterCache(
+                max_bytes=self.filter_cache_bytes,
+                spill_dir=f"{self.get_analysis_path()}/filter_cache" if self.filter_cache_spill else None
+            ),
+            epoch_pool=epoch_pool,
+            rpeak_detector=RPeakDetector(
+                checkpoint_dir=f"{self.get_analysis_path()}/rpeak_checkpoints",
+                index_dir=f"{self.get_analysis_path()}/rpeaks",
+                pool=epoch_pool
+            )
+        )
+        with context.activate():
+            self.execute_commands(edf)
+
+    def execute_commands(self, edf: EDFutils) -> None:
+        # index of the last command reading each raw channel, after which
+        # the channel can be dropped from the cache
+        last_use = {cmd['channel']: i for i, cmd in enumerate(self.commands)
+                    if not cmd['is_derived']}
+        # index of the last command computing or reading each derivand, after
+        # which a spectral density can drop its PSD matrix
+        last_derived = {}
+        for i, cmd in enumerate(self.commands):
+            last_derived[cmd['alias']] = i
+            if cmd['is_derived']:
+                last_derived[self.get_derivand_name(cmd)] = i
+
         loading_bar = st.progress(0, "Calcuting features, please wait...")
         for i, cmd in enumerate(self.commands):
             loading_bar.progress(i/len(self.commands), 
                 f"Calculating {cmd['alias']} (feature {i+1} of "
                 f"{len(self.commands)}), please wait...")
-            ch = edf[cmd['channel']]
             if cmd['is_derived']:
-                len_self = len(cmd['alias'].split('.')[-1])+1
-                derivand_name = cmd['alias'][:-len_self]
+                ch = None
+                derivand_name = self.get_derivand_name(cmd)
             else: 
+                ch = edf[cmd['channel']]
                 derivand_name = None
             feature = self.execute_command(ch, cmd, derivand_name)
-            self.save_feature(feature, specs=cmd)
+            lineage = getattr(self.derivand_store.get(cmd['alias']), 'lineage', None)
+            self.save_feature(feature, specs=cmd, lineage=lineage)
+            if last_use.get(cmd['channel']) == i:
+                edf.release(cmd['channel'])
+            if not self.keep_psd:
+                for alias in [a for a, last in last_derived.items() if last == i]:
+                    if isinstance(self.derivand_store.get(alias), SpectralDensity):
+                        self.derivand_store[alias].release_psd()
         loading_bar.empty()
         st.success("Feature calculation successful!")
             
-    def execute_command(self, root_obj, command, derivand_name=None) -> dict:
+    @staticmethod
+    def get_derivand_name(command: dict) -> str:
+        len_self = len(command['alias'].split('.')[-1])+1
+        return command['alias'][:-len_self]
+
+    def execute_command(self, root_obj, command, derivand_name=None) -> pd.DataFrame|pa.Table:
         if not command['is_derived']:
             feature = root_obj.run_method(command['method'], command['args'])
         else:
@@ -50,7 +109,7 @@ class BuildFeatures(SessionConfig, PlottingUtils):
         if not isinstance(feature, dict):
             self.derivand_store[command['alias']] = feature
             if issubclass(feature.__class__, Channel):
-                feature = feature.to_DataFrame()
+                feature = feature.to_arrow()
             elif isinstance(feature, Epoch):
                 feature = pd.DataFrame.from_dict({'epoch': feature.times})
             elif isinstance(feature, SpectralDensity):
@@ -62,11 +121,19 @@ class BuildFeatures(SessionConfig, PlottingUtils):
             feature = derivand.make_dataframe(feature)
         return feature
     
-    def save_feature(self, feature_df: pd.DataFrame, specs: dict) -> None:
+    def save_feature(self, feature: pd.DataFrame|pa.Table, specs: dict, lineage: dict=None) -> None:
         parent = self.get_analysis_path()
         if self.feature_store_name not in os.listdir(parent):
             os.mkdir(f"{parent}/{self.feature_store_name}")
-        feature_df.to_csv(f"{parent}/{self.feature_store_name}/{specs['alias']}.csv", index=False)
+        if isinstance(feature, pd.DataFrame):
+            feature = pa.Table.from_pandas(feature, preserve_index=False)
+        pa_csv.write_csv(feature, f"{parent}/{self.feature_store_name}/{specs['alias']}.csv")
+        if lineage is not None:
+            lineage_path = f"{parent}/{self.feature_store_name}/lineage.json"
+            lineages = self.read_json(lineage_path) if os.path.exists(lineage_path) else {}
+            lineages[specs['alias']] = lineage
+            with open(lineage_path, 'w') as f:
+                json.dump(lineages, f, default=str, indent=4)
 
     def compile_commands(self) -> None:
         self.commands = self.flatten_configuration()
@@ -165,7 +232,7 @@ class BuildFeatures(SessionConfig, PlottingUtils):
         cpicker_c = st.container()
 
         feature_store = self.get_file_from_analysis(self.feature_store_name)
-        features = os.listdir(feature_store)
+        features = [i for i in os.listdir(feature_store) if i.endswith('.csv')]
         if features and feature_store:
             opts = ['.'.join(i.split('.')[:-1]) for i in features]
             pick = picker_c.selectbox(
@@ -6,11 +6,12 @@ from utils.SessionBase import SessionBase
 from utils.EDF.EDF import EDFutils
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 from config.channelcompute import CHANNEL_TYPES
+from config.meta import EDF_BACKEND
 
 
 @st.cache_data(show_spinner=False)
 def load_edf_details(path):
-    edf = EDFutils(path)
+    edf = EDFutils(path, backend=EDF_BACKEND)
     details = {}
     details['start_ts'] = edf.start_ts
     details['end_ts'] = edf.end_ts
@@ -243,15 +244,21 @@ class ConfigureEDF(SessionBase):
         else:
             return (True, "Configuration valid, please confirm & save (will overwrite previous)")
         
-    def save_configuration(self):
+    def save_configuration(self, convert:bool=False):
         """
         Writes config file to `ANALYSIS_STORE`/`ANALYSIS`/EDFconfiog.json.
+        convert: also convert the picked channels not yet in the columnar store
         """
+        config = self.construct_configuration()
         self.write_configuration(
-            config=self.construct_configuration(),
+            config=config,
             analysis=self.analysis,
             name=self.config_name
         )
+        if convert:
+            with st.spinner('Converting picked channels to columnar store, this may take a while...'):
+                edf = EDFutils(self.edfpath, backend=EDF_BACKEND)
+                edf.write_store([ch for ch in config['channels']['picked'] if not edf.store.has(ch)])
         st.toast(f"Configuration saved.")
 
     @staticmethod
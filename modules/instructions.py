@@ -8,6 +8,9 @@ FEATURE_FREQUENCY_HELP = "All features genereated herein must be of the same out
 N_COMPS_HELP = "You may want to calculate multiple instances of a feature to experiment with different " \
                "parameters like window sizes, etc."
 
+COLUMNAR_STORE_HELP = "Stores a compressed, chunked copy of every picked channel next to the EDF. Takes extra " \
+                      "time and disk space when saving, but feature builds then skip reading the EDF."
+
 ANALYSIS_NAME = 'This will be a directory name, special characters may be rejected'
 
 def feature_generation():
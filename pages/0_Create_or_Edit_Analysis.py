@@ -78,8 +78,9 @@ else:
             else:
                 st.success(edf_valid[1])
             
+            convert = st.checkbox('Convert picked channels to columnar store', help=instruct.COLUMNAR_STORE_HELP)
             if st.button("Save Configuration", disabled=not edf_valid[0], use_container_width=True):
-                edfWidgets.save_configuration()
+                edfWidgets.save_configuration(convert=convert)
 
     with label_pane:
         lblWidgets = ConfigureLabel(analysis_name)
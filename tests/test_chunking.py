@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from utils.EDF.EDF import EDFutils
+from utils.EDF.Chunking import run_chunked
+
+
+def write_edf(path, name: str, freq: int, signal: np.array) -> None:
+    """
+    Minimal single-channel EDF with one-second records.
+    """
+    def field(value, width: int) -> bytes:
+        return str(value).encode()[:width].ljust(width)
+
+    n_records = len(signal) // freq
+    pmin, pmax = np.floor(signal.min()) - 1, np.ceil(signal.max()) + 1
+    header = field(0, 8) + field('X X X X', 80) + field('Startdate X X X X', 80) + \
+        field('01.02.24', 8) + field('10.20.30', 8) + field(512, 8) + field('', 44) + \
+        field(n_records, 8) + field(1, 8) + field(1, 4) + \
+        field(name, 16) + field('', 80) + field('uV', 8) + field(int(pmin), 8) + \
+        field(int(pmax), 8) + field(-32768, 8) + field(32767, 8) + field('', 80) + \
+        field(freq, 8) + field('', 32)
+    digital = np.round((signal - pmin) / (pmax - pmin) * 65535 - 32768).astype('<i2')
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(digital.tobytes())
+
+
+@pytest.fixture(scope='module')
+def edf(tmp_path_factory) -> EDFutils:
+    path = tmp_path_factory.mktemp('edf') / 'pressure.edf'
+    rng = np.random.default_rng(0)
+    write_edf(path, 'Pressure', 25, np.cumsum(rng.standard_normal(25 * 3600)))
+    return EDFutils(str(path), backend='native')
+
+
+@pytest.mark.parametrize('method', ['get_rolling_mean', 'get_rolling_std'])
+def test_aligned_chunks_match_full_channel(edf, method):
+    args = {'window_sec': 30, 'step_size': 1}
+    full = edf['Pressure'].run_method(method, args)
+    stitched = run_chunked(edf.iter_chunks('Pressure', chunk_sec=600, overlap_sec=60), method, args)
+    assert len(stitched.signal) == len(full.signal) == 3600
+    np.testing.assert_allclose(stitched.signal, full.signal, rtol=1e-9, equal_nan=True)
+    np.testing.assert_allclose(stitched.time, full.time)
+
+
+def test_unaligned_chunks_are_rejected(edf):
+    # 301.3 s chunks start between the 1 Hz output points of the full channel
+    with pytest.raises(ValueError, match='multiples of the output sampling period'):
+        run_chunked(edf.iter_chunks('Pressure', chunk_sec=301.3, overlap_sec=60),
+                    'get_rolling_mean', {'window_sec': 30, 'step_size': 1})
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+import antropy as ant
+from utils.EDF.Complexity import perm_entropy, higuchi_fd
+
+
+def make_epochs() -> np.array:
+    rng = np.random.default_rng(0)
+    n_times = 300
+    return np.vstack([
+        rng.standard_normal(n_times),                    # random
+        np.full(n_times, 3.0),                           # constant
+        rng.integers(0, 3, n_times).astype(float),       # many ties
+        np.repeat(rng.standard_normal(n_times // 5), 5), # runs of ties
+        np.arange(n_times, dtype=float),                 # increasing ramp
+        -np.arange(n_times, dtype=float),                # decreasing ramp
+        np.sin(np.linspace(0, 20, n_times)),
+    ])
+
+
+@pytest.mark.parametrize('order', [3, 4, 5])
+@pytest.mark.parametrize('delay', [1, 2])
+@pytest.mark.parametrize('normalize', [False, True])
+def test_perm_entropy_matches_antropy(order, delay, normalize):
+    epochs = make_epochs()
+    expected = [ant.perm_entropy(row, order=order, delay=delay, normalize=normalize) for row in epochs]
+    np.testing.assert_allclose(perm_entropy(epochs, order, delay, normalize), expected, rtol=1e-12, atol=1e-12)
+
+
+def test_perm_entropy_strided_view():
+    epochs = make_epochs()
+    view = epochs[:, ::2]
+    expected = [ant.perm_entropy(row, order=3, delay=1) for row in view]
+    np.testing.assert_allclose(perm_entropy(view, 3, 1), expected, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('kmax', [5, 10])
+def test_higuchi_fd_matches_antropy(kmax):
+    epochs = make_epochs()
+    expected = [ant.higuchi_fd(row, kmax=kmax) for row in epochs]
+    np.testing.assert_allclose(higuchi_fd(epochs, kmax), expected, rtol=1e-12, equal_nan=True)
+
+
+def test_higuchi_fd_float32_input():
+    epochs = make_epochs().astype(np.float32)
+    expected = [ant.higuchi_fd(row.astype(np.float64), kmax=10) for row in epochs]
+    np.testing.assert_allclose(higuchi_fd(epochs, 10), expected, rtol=1e-12, equal_nan=True)
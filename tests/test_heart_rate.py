@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from utils.EDF.ECGChannel import ECGChannel
+
+
+def synthetic_ecg(freq: int, seconds: int, seed:int=0) -> np.array:
+    rng = np.random.default_rng(seed)
+    n_samples = freq * seconds
+    rr = np.clip(0.9 + 0.05 * rng.standard_normal(int(seconds * 1.5)), 0.5, 1.5)
+    beats = (np.cumsum(rr) * freq).astype(int)
+    beats = beats[beats < n_samples - freq]
+    half = int(0.05 * freq)
+    k = np.arange(-half, half + 1)
+    qrs = np.exp(-(k / (0.012 * freq)) ** 2)
+    signal = 0.02 * rng.standard_normal(n_samples)
+    for beat in beats:
+        signal[beat - half: beat + half + 1] += qrs
+    return signal
+
+
+@pytest.fixture(scope='module')
+def ecg() -> ECGChannel:
+    return ECGChannel(start_ts=datetime(2024, 1, 1), end_ts=None, name='ECG',
+                      signal=synthetic_ecg(250, 600), freq=250, type_='ECG')
+
+
+def test_default_output_is_4_hz(ecg):
+    hr = ecg.get_heart_rate()
+    assert hr.freq == 4
+    assert len(hr.signal) == 2400
+    assert hr.time[-1] < 600
+
+
+def test_non_dividing_step_size_stays_on_grid(ecg):
+    # 250 Hz / 4 Hz is 62.5 samples, a truncated stride of 62 would run past the end of the record
+    hr = ecg.get_heart_rate(step_size=4)
+    full = ecg.get_heart_rate(step_size=250)
+    assert len(full.signal) == len(ecg.signal)
+    positions = np.arange(2400) * 62.5
+    on_sample = positions == np.floor(positions)
+    np.testing.assert_allclose(hr.signal[on_sample], full.signal[positions[on_sample].astype(int)])
+
+
+def test_heart_rate_range(ecg):
+    hr = ecg.get_heart_rate(step_size=1)
+    assert len(hr.signal) == 600
+    assert not np.isnan(hr.signal).any()
+    # beats are 0.9 s apart on average
+    assert abs(np.median(hr.signal) - 60 / 0.9) < 3
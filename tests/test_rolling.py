@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+from utils.EDF.Channel import Channel
+
+
+def make_channel(freq=100, seconds=600) -> Channel:
+    rng = np.random.default_rng(0)
+    return Channel(start_ts=datetime(2024, 1, 1), end_ts=None, name='x',
+                   signal=rng.standard_normal(freq * seconds).cumsum(), freq=freq)
+
+
+def expected_rolling(channel, window_sec, step_size, reducer, **kwargs) -> np.array:
+    window = int(round(window_sec * channel.freq))
+    n_out = int(np.ceil(len(channel.signal) * step_size / channel.freq))
+    positions = np.floor(np.arange(n_out) * channel.freq / step_size + 1e-9).astype(int)
+    rolled = getattr(pd.Series(channel.signal).rolling(window, center=True), reducer)(**kwargs)
+    return rolled.to_numpy()[positions]
+
+
+@pytest.fixture
+def decimated() -> Channel:
+    channel = make_channel().downsample(2.5, mode='decimate')
+    assert channel.freq == 2.5
+    return channel
+
+
+def test_rolling_mean_on_decimated_channel(decimated):
+    out = decimated.get_rolling_mean(window_sec=30, step_size=1)
+    assert out.freq == 1
+    assert len(out.signal) == 600
+    np.testing.assert_allclose(out.signal, expected_rolling(decimated, 30, 1, 'mean'), equal_nan=True)
+
+
+def test_rolling_std_on_decimated_channel(decimated):
+    out = decimated.get_rolling_std(window_sec=30, step_size=1)
+    assert len(out.signal) == 600
+    np.testing.assert_allclose(out.signal, expected_rolling(decimated, 30, 1, 'std'), equal_nan=True)
+
+
+@pytest.mark.parametrize('reducer', ['median', 'max'])
+def test_rolling_on_decimated_channel(decimated, reducer):
+    out = decimated.rolling(window_sec=30, step_size=0.5, reducer=reducer)
+    assert out.freq == 0.5
+    assert len(out.signal) == 300
+    np.testing.assert_allclose(out.signal, expected_rolling(decimated, 30, 0.5, reducer), equal_nan=True)
+
+
+def test_apply_rolling_on_decimated_channel(decimated):
+    out = decimated._apply_rolling(window_sec=30, step_size=1, process=np.mean)
+    assert len(out) == int(np.ceil(len(decimated.signal) / 2.5))
+    assert np.isfinite(out).any()
+
+
+def test_rolling_output_grid_does_not_drift():
+    # 100 / 3 samples between outputs, a truncated stride of 33 would gain one output per 100 s
+    channel = make_channel(freq=100, seconds=600)
+    out = channel.get_rolling_mean(window_sec=10, step_size=3)
+    assert len(out.signal) == 1800
+    np.testing.assert_allclose(out.signal, expected_rolling(channel, 10, 3, 'mean'), equal_nan=True)
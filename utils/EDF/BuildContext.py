@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Self
+from .FilterCache import FilterCache, filter_cache
+from .EpochPool import EpochPool, epoch_pool
+from .RPeaks import RPeakDetector, rpeak_detector
+
+
+_current = ContextVar('build_context')
+
+
+class BuildContext:
+    def __init__(self, filter_cache:FilterCache=None, epoch_pool:EpochPool=None,
+                 rpeak_detector:RPeakDetector=None) -> None:
+        """
+        Filter cache, worker pool and R-peak detector used by the Channels and
+        Epochs of one feature build. Each build activates its own, so builds
+        of concurrent sessions (threads of the same process) never share spill,
+        checkpoint or index directories, nor shut down each other's workers.
+        Outside of a build the module level instances are used.
+        filter_cache: FilterCache of the build
+        epoch_pool: EpochPool of the build
+        rpeak_detector: RPeakDetector of the build, should run on `epoch_pool`
+        """
+        self.filter_cache = filter_cache
+        self.epoch_pool = epoch_pool
+        self.rpeak_detector = rpeak_detector
+
+    @staticmethod
+    def current() -> Self:
+        """
+        BuildContext active in the calling thread, or the module level instances.
+        """
+        return _current.get(_default)
+
+    @contextmanager
+    def activate(self) -> Iterator[Self]:
+        """
+        Makes this the current BuildContext of the calling thread, shutting
+        down its worker pool on exit.
+        """
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+            self.epoch_pool.shutdown()
+
+
+_default = BuildContext(filter_cache, epoch_pool, rpeak_detector)
@@ -1,21 +1,47 @@
 import numpy as np
 import pandas as pd
-import inspect
+import pyarrow as pa
+import json
 from typing import Self
 from datetime import timedelta
 from .Base import Base
+from .Rolling import rolling_reduce, window_bounds, apply_windows
+from .Resampling import decimate_signal
 
 
 class Channel(Base):
-    def __init__(self, start_ts, end_ts, name: str, signal: np.array, time:np.array=None, freq=None, type_=None) -> None:
+    def __init__(self, start_ts, end_ts, name: str, signal: np.array, time:np.array=None, freq=None, type_=None, time_offset:float=0, lineage:dict=None) -> None:
+        """
+        Uniformly sampled channels leave `time` as None, their time axis is
+        implied by `time_offset` and `freq` and only materialized on access.
+        An explicit `time` array is kept for irregularly sampled signals.
+        `lineage` records how a derived channel was computed (see _return),
+        or the source file, channel and time range of channels read from the EDF.
+        """
         self.name = name
-        self.time = time
+        self._time = time
+        self.time_offset = time_offset
         self.signal = signal
         self.freq = freq
         self.type = type_
+        self.lineage = lineage
         self.start_ts = start_ts
-        self.end_ts = end_ts if end_ts else self.start_ts + timedelta(seconds=time[-1])
-            
+        self.end_ts = end_ts if end_ts else self.start_ts + timedelta(seconds=self.time[-1])
+
+    @property
+    def time(self) -> np.array:
+        """
+        Seconds since the start of the (date-ranged) recording for each sample.
+        """
+        if self._time is not None:
+            return self._time
+        return self.time_offset + np.arange(len(self.signal)) / self.freq
+
+    @property
+    def nbytes(self) -> int:
+        time_nbytes = self._time.nbytes if self._time is not None else 0
+        return self.signal.nbytes + time_nbytes
+
     def __getitem__(self, slice) -> Self:
         """
         Enables object indexing, returns a new Channel instance with signal 
@@ -27,15 +53,19 @@ class Channel(Base):
             if freq.is_integer():
                 freq = int(freq)
 
-        slice_time = self.time[slice]
+        start = slice.indices(len(self.signal))[0]
+        slice_time = self._time[slice] if self._time is not None else None
         slice_signal = self.signal[slice]
-        return Channel(
+        return self.__class__(
             name=self.name,
             signal=slice_signal,
             time=slice_time,
             freq=freq,
             start_ts=self.start_ts,
-            end_ts=self.end_ts
+            end_ts=self.end_ts,
+            type_=self.type,
+            time_offset=self.time_offset + start / self.freq,
+            lineage=self.lineage
         )
     
     def time_slice(self, start_time, end_time, unit='second') -> Self:
@@ -57,8 +87,8 @@ class Channel(Base):
                 raise ValueError(
                     f'Only accepts second, minute, and hour, not {unit}')
         
-        start = mod * self.freq * start_time
-        end = mod * self.freq * end_time
+        start = int(mod * self.freq * start_time)
+        end = int(mod * self.freq * end_time)
         return self[start:end]
     
     def date_slice(self, start_date, end_date) -> Self:
@@ -74,53 +104,113 @@ class Channel(Base):
         relative_start_ts = start_ts - recording_start_ts
         relative_end_ts = end_ts - recording_start_ts
 
-        start_idx = np.searchsorted(self.time, relative_start_ts)
-        end_idx = np.searchsorted(self.time, relative_end_ts, side='right')
-
-        slice_signal = self.signal[start_idx:end_idx]
-        slice_time = self.time[start_idx:end_idx]
-
-        return self.__class__(
-            name=self.name,
-            signal=slice_signal,
-            time=slice_time,
-            freq=self.freq,
-            start_ts=self.start_ts,
-            end_ts=self.end_ts
-        )
+        if self._time is not None:
+            start_idx = np.searchsorted(self._time, relative_start_ts)
+            end_idx = np.searchsorted(self._time, relative_end_ts, side='right')
+        else:
+            n = len(self.signal)
+            start_idx = min(max(int(np.ceil((relative_start_ts - self.time_offset) * self.freq)), 0), n)
+            end_idx = min(max(int(np.floor((relative_end_ts - self.time_offset) * self.freq)) + 1, 0), n)
+        return self[start_idx:end_idx]
 
     
-    def _return(self, new_signal, step_size) -> Self:
+    def _return(self, new_signal, step_size, method:str, args:dict) -> Self:
         """
         Used to generalize the return of window functions to minimize
-        copy-pasting. Takes name of the process/method that calls it and uses 
-        that to assign the name of the returned Channel object. 
+        copy-pasting. Names the returned Channel object after the method that
+        produced it and records its lineage: parent name, method, arguments,
+        output frequency and the parent's own lineage.
         Calculates new frequency values based on input process modifications.
         new_signal: the new array to be assigned to Channel.signal
         step_size: step size of the window function used to calculate the new freq
+        method: name of the method producing the new Channel
+        args: arguments the method was called with
         """
-        # inspect.stack()[1][3] returns the name of the function
-        # traced back before this function call
-        new_name = f'{self.name}.{inspect.stack()[1][3]}'
-        new_time = self.time[::self.freq//step_size]
-        new_freq = step_size/1
+        new_freq = step_size / 1
+        if new_freq.is_integer():
+            new_freq = int(new_freq)
+        new_time = None
+        if self._time is not None:
+            stride = self.freq / new_freq
+            if stride.is_integer():
+                new_time = self._time[::int(stride)]
+            else:
+                # non-integer ratios (e.g. decimating to 2.5 Hz) land between samples
+                positions = np.arange(len(new_signal)) * stride
+                new_time = np.interp(positions, np.arange(len(self._time)), self._time)
+        lineage = {
+            'parent': self.name,
+            'method': method,
+            'args': args,
+            'freq': new_freq,
+            'parent_lineage': self.lineage
+        }
         return self.__class__(
             start_ts=self.start_ts,
             end_ts=self.end_ts,
-            name=new_name,
+            name=f'{self.name}.{method}',
             signal=new_signal,
             time=new_time,
-            freq=int(new_freq)  # should never be a float...
-            # TODO support for non-integer frequencies?
+            freq=new_freq,
+            time_offset=self.time_offset,
+            lineage=lineage
+        )
+
+    def lineage_key(self) -> str:
+        """
+        Serialized lineage of this Channel and the time span it covers, identifies
+        its content for caching and is written alongside features.
+        """
+        return json.dumps(
+            {
+                'name': self.name,
+                'lineage': self.lineage,
+                'start_ts': self.start_ts,
+                'time_offset': self.time_offset,
+                'n_samples': len(self.signal),
+                'freq': self.freq
+            },
+            sort_keys=True,
+            default=str
         )
     
-    def downsample(self, ds_freq:int=1):
+    def has_source(self) -> bool:
+        """
+        Whether the lineage traces back to a file read from disk, only then
+        does lineage_key identify the signal and may it key shared caches.
+        """
+        lineage = self.lineage
+        while lineage is not None and 'parent_lineage' in lineage:
+            lineage = lineage['parent_lineage']
+        return lineage is not None and 'source' in lineage
+
+    def downsample(self, ds_freq:int=1, mode:str='subsample', ftype:str='fir') -> Self:
         """
         ds_freq: frequency in Hz to which this channel will be downsampled
+        mode: 'subsample' keeps every n-th sample, 'decimate' low-pass filters first
+        to prevent aliasing (and supports non-integer frequency ratios)
+        ftype: 'fir' or 'iir' anti-aliasing filter used by the decimate mode
         """
-        ss = self.freq//ds_freq
-        ds_sig = self.signal[::ss]
-        return self._return(ds_sig, step_size=ss)
+        match mode:
+            case 'subsample':
+                if not (self.freq / ds_freq).is_integer():
+                    raise ValueError(f"Subsampling needs ds_freq to divide the channel frequency "
+                                     f"({self.freq} Hz), not {ds_freq}, use mode='decimate'")
+                ss = int(self.freq // ds_freq)
+                ds_sig = self.signal[::ss]
+            case 'decimate':
+                ds_sig = decimate_signal(self.signal, self.freq, ds_freq, ftype)
+            case _:
+                raise ValueError(f'Only accepts subsample and decimate, not {mode}')
+        return self._return(ds_sig, step_size=ds_freq, method='downsample',
+                            args={'ds_freq': ds_freq, 'mode': mode, 'ftype': ftype})
+
+    def _window_samples(self, window_sec) -> int:
+        """
+        Window length in samples, rounded as non-integer frequencies (e.g. of
+        decimated channels) rarely give a whole number of samples.
+        """
+        return int(round(window_sec * self.freq))
 
     def get_rolling_mean(self, window_sec:int=30, step_size:int=1) -> Self:
         """
@@ -128,9 +218,9 @@ class Channel(Base):
         window_sec: window size for rolling mean in seconds
         step_size: step over which to resample the output Channel
         """
-        rolling_mean = pd.Series(self.signal).rolling(window_sec*self.freq, center=True)\
-            .mean()[::self.freq].values
-        return self._return(rolling_mean, step_size)
+        rolling_mean = rolling_reduce(self.signal, self._window_samples(window_sec), self.freq/step_size, 'mean')
+        return self._return(rolling_mean, step_size, method='get_rolling_mean',
+                            args={'window_sec': window_sec, 'step_size': step_size})
 
     def get_rolling_std(self, window_sec:int=30, step_size:int=1) -> Self:
         """
@@ -139,41 +229,68 @@ class Channel(Base):
         window_sec: window size for rolling std in seconds
         step_size: step over which to resample the output Channel
         """
-        rolling_std = pd.Series(self.signal).rolling(window_sec*self.freq, center=True)\
-            .std()[::self.freq].values
-        return self._return(rolling_std, step_size)
+        rolling_std = rolling_reduce(self.signal, self._window_samples(window_sec), self.freq/step_size, 'std')
+        return self._return(rolling_std, step_size, method='get_rolling_std',
+                            args={'window_sec': window_sec, 'step_size': step_size})
+
+    def rolling(self, window_sec:int=30, step_size:int=1, reducer:str='mean', center:bool=True, q:float=None) -> Self:
+        """
+        Rolling statistic of Channel.signal evaluated only at the output points,
+        see Rolling.rolling_reduce. Returns new Channel instance
+        window_sec: window size in seconds
+        step_size: output frequency in Hz
+        reducer: one of sum, mean, var, std, min, max, median, quantile
+        center: center windows on their output point, else windows end on it
+        q: quantile in [0, 1] for the quantile reducer
+        """
+        rolled = rolling_reduce(self.signal, self._window_samples(window_sec), self.freq/step_size,
+                                reducer, center, q)
+        return self._return(rolled, step_size, method='rolling',
+                            args={'window_sec': window_sec, 'step_size': step_size,
+                                  'reducer': reducer, 'center': center, 'q': q})
     
     def _apply_rolling(self, window_sec, step_size, process) -> np.array:
         """
         Generalized pattern to apply a transformation over a rolling window.
         window_sec: window size for applied process in seconds
         step_size: step over which to resample the signal frequency
-        process: function to apply over the rolling window
-        """
-        window_length = window_sec * self.freq
-        step_idx = int(step_size * self.freq)
-
-        accum = []
-        for i in range(0, len(self.signal), step_idx):
-            window_start = i - window_length//2
-            window_end = i + window_length//2
-            if window_start < 0:
-                accum.append(np.nan)
-            elif window_end > len(self.signal):
-                accum.append(np.nan)
-            else:
-                accum.append(process(self.signal, window_start, window_end))
-        return np.array(accum)
+        process: vectorized function reducing windows along an `axis` keyword,
+        e.g. np.mean or scipy.stats.skew
+        """
+        window_length = self._window_samples(window_sec)
+        step_idx = step_size * self.freq
+
+        # windows span [i - window_length//2, i + window_length//2) around every
+        # output index i, those running past either end of the signal are NaN
+        window = 2 * (window_length // 2)
+        starts, valid = window_bounds(len(self.signal), window, step_idx)
+        accum = np.full(len(starts), np.nan)
+        accum[valid] = apply_windows(
+            self.signal, window, starts[valid],
+            lambda windows: process(windows, axis=1)
+        )
+        return accum
     
     def to_DataFrame(self) -> pd.DataFrame:
         """
-        Returns 2-column pandas DataFrame of time and signal
+        Returns 2-column pandas DataFrame of time and signal, built column by
+        column from the existing arrays without copying them
         """
-        assert len(self.signal) == len(self.time)
-        return pd.DataFrame(
-            data=np.array([self.time, self.signal]).T,
-            columns=['time', self.name]
-        )
+        time = self.time
+        assert len(self.signal) == len(time)
+        return pd.DataFrame({'time': time, self.name: self.signal}, copy=False)
+
+    def to_arrow(self) -> pa.Table:
+        """
+        Returns 2-column pyarrow Table of time and signal, contiguous arrays are
+        wrapped without copying
+        """
+        time = self.time
+        assert len(self.signal) == len(time)
+        return pa.table({
+            'time': pa.array(np.ascontiguousarray(time)),
+            self.name: pa.array(np.ascontiguousarray(self.signal))
+        })
 
     def visualize(self):
         """
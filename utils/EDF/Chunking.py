@@ -0,0 +1,120 @@
+import numpy as np
+import pandas as pd
+from typing import Iterable, Iterator
+from .Channel import Channel
+from .Epoch import Epoch
+from .SpectralDensity import SpectralDensity
+
+
+def _core_mask(piece: Channel, time: np.array) -> np.array:
+    """
+    Marks the values of an output whose timestamps fall in the core of the
+    piece it was computed from. Half a sample of slack absorbs float error.
+    """
+    core_start, core_end = piece.chunk['core']
+    return (time >= (core_start - 0.5) / piece.freq) & \
+        (time < (core_end - 0.5) / piece.freq)
+
+
+def run_chunked(pieces: Iterable[Channel], method_name: str, args: dict=None) -> Channel:
+    """
+    Runs a Channel method returning a Channel (e.g. get_rolling_mean,
+    get_rolling_std, get_heart_rate) over each piece of EDFutils.iter_chunks,
+    keeps the output of each piece's core and stitches them together.
+    The overlap of the pieces must cover the method's window, and `chunk_sec`
+    and `overlap_sec` must be multiples of the output's sampling period so that
+    pieces share the output grid of the full channel.
+    pieces: pieces yielded by EDFutils.iter_chunks
+    method_name: name of the Channel method to run
+    args: keyword arguments of the method
+    """
+    args = {} if args is None else args
+    signals = []
+    time_offset = None
+    out = None
+    for piece in pieces:
+        out = piece.run_method(method_name, args)
+        # the piece's first output must fall on the full channel's output grid
+        grid_offset = piece.chunk['offset'] * out.freq / piece.freq
+        if abs(grid_offset - round(grid_offset)) > 1e-9:
+            raise ValueError("Chunk and overlap lengths must be multiples of "
+                             f"the output sampling period ({1 / out.freq} s)")
+        keep = _core_mask(piece, out.time)
+        signals.append(out.signal[keep])
+        if time_offset is None and keep.any():
+            time_offset = out.time[keep][0]
+    if out is None:
+        raise ValueError("No pieces to run the method on")
+
+    return out.__class__(
+        start_ts=out.start_ts,
+        end_ts=out.end_ts,
+        name=out.name,
+        signal=np.concatenate(signals),
+        freq=out.freq,
+        type_=out.type,
+        time_offset=time_offset,
+        lineage=out.lineage
+    )
+
+
+def iter_epochs(pieces: Iterable[Channel], freq_broad: tuple[float, float],
+                window_sec: int, step_size: int) -> Iterator[Epoch]:
+    """
+    Builds an Epoch over each piece of EDFutils.iter_chunks and keeps only the
+    epochs starting in the piece's core, with times relative to the start of
+    the full channel. `chunk_sec` and `overlap_sec` must be multiples of
+    `step_size` so that pieces share the epoch grid of the full channel, and the
+    overlap must cover `window_sec` plus the bandpass filter's settling time.
+    pieces: pieces yielded by EDFutils.iter_chunks
+    freq_broad: bandpass range applied before epoching
+    window_sec: size of the epoch window in seconds
+    step_size: step between epochs in seconds
+    """
+    for piece in pieces:
+        offset = piece.chunk['offset']
+        core_start, core_end = piece.chunk['core']
+        if offset % (step_size * piece.freq):
+            raise ValueError("Chunk and overlap lengths must be multiples of "
+                             f"the epoch step size ({step_size} s)")
+        epoch = Epoch(piece, freq_broad, window_sec, step_size)
+        starts = offset + (epoch.times - window_sec // 2) * piece.freq
+        # the kept epochs are contiguous, slicing keeps them a view of the piece
+        first, last = np.searchsorted(starts, [core_start, core_end])
+        epoch.times = epoch.times[first:last] + offset / piece.freq
+        epoch.epochs = epoch.epochs[first:last]
+        yield epoch
+
+
+def run_chunked_epoch(pieces: Iterable[Channel], freq_broad: tuple[float, float],
+                      window_sec: int, step_size: int, method_name: str,
+                      args: dict=None) -> pd.DataFrame:
+    """
+    Runs an Epoch feature method chunk by chunk (see iter_epochs) and returns
+    the stitched feature in the same shape as Epoch.make_dataframe.
+    pieces: pieces yielded by EDFutils.iter_chunks
+    freq_broad: bandpass range applied before epoching
+    window_sec: size of the epoch window in seconds
+    step_size: step between epochs in seconds
+    method_name: name of the Epoch method to run
+    args: keyword arguments of the method
+    """
+    args = {} if args is None else args
+    times = []
+    features = {}
+    for epoch in iter_epochs(pieces, freq_broad, window_sec, step_size):
+        if not len(epoch.times):
+            continue
+        feature = epoch.run_method(method_name, args)
+        if isinstance(feature, SpectralDensity):
+            feature = feature.welches
+        times.append(epoch.times)
+        for name, values in feature.items():
+            features.setdefault(name, []).append(values)
+
+    return pd.DataFrame.from_dict(
+        {
+            'time': np.concatenate(times),
+            **{name: np.concatenate(values) for name, values in features.items()}
+        }
+    )
@@ -0,0 +1,94 @@
+import os
+import json
+import numpy as np
+from .EDFReader import EDFReader
+
+
+class ColumnarStore:
+    def __init__(self, root, source) -> None:
+        """
+        Chunked, compressed float32 copy of the channels of an EDF, one
+        directory per channel holding one `.npz` file per chunk of samples.
+        Sample i of a channel lives in chunk i // chunk_samples, so any time
+        range can be read by loading only the chunks it overlaps.
+        root: directory of the store
+        source: path of the EDF the store mirrors, the store is ignored once it changes
+        """
+        self.root = root
+        self.source = source
+        self.index_path = f"{root}/index.json"
+        self.index = self.read_index()
+
+    def _source_key(self) -> dict:
+        stat = os.stat(self.source)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def read_index(self) -> dict:
+        """
+        Loads the store's index, an empty one if it is missing or stale.
+        """
+        empty = {'source': None, 'channels': {}}
+        if not (os.path.exists(self.index_path) and os.path.exists(self.source)):
+            return empty
+        with open(self.index_path) as f:
+            index = json.load(f)
+        if index['source'] != self._source_key():
+            return empty
+        return index
+
+    def has(self, channel) -> bool:
+        return channel in self.index['channels']
+
+    def write(self, edf, channels:list=None, chunk_sec:int=600) -> None:
+        """
+        Converts channels of an EDF into the store, reading them chunk by chunk.
+        The whole recording is stored regardless of the EDF's date range.
+        edf: EDFutils of the source EDF
+        channels: channels to convert, default converts all
+        chunk_sec: length of each stored chunk in seconds
+        """
+        channels = edf.channels if channels is None else channels
+        reader = edf.reader if edf.reader is not None else EDFReader(self.source)
+        os.makedirs(self.root, exist_ok=True)
+        self.index['source'] = self._source_key()
+
+        for ch in channels:
+            first, last = reader.sample_range(ch)
+            freq = edf.channel_freqs[ch]
+            chunk_samples = int(chunk_sec * freq)
+            ch_dir = f"ch{reader.channels.index(ch):03d}"
+            os.makedirs(f"{self.root}/{ch_dir}", exist_ok=True)
+            for i, start in enumerate(range(first, last, chunk_samples)):
+                end = min(start + chunk_samples, last)
+                signal = edf.read_edf_samples(ch, start, end).astype(np.float32)
+                np.savez_compressed(f"{self.root}/{ch_dir}/chunk_{i:05d}.npz", signal=signal)
+
+            self.index['channels'][ch] = {
+                'dir': ch_dir,
+                'freq': freq,
+                'n_samples': last - first,
+                'chunk_samples': chunk_samples
+            }
+            # written after every channel so an interrupted conversion keeps finished channels
+            with open(self.index_path, 'w') as f:
+                json.dump(self.index, f, indent=4)
+
+    def read_samples(self, channel, start:int, end:int) -> np.array:
+        """
+        Reads samples [start, end) of a stored channel as float64.
+        channel: channel to read
+        start: index of the first sample
+        end: index of the sample at which reading stops (exclusive)
+        """
+        meta = self.index['channels'][channel]
+        chunk_samples = meta['chunk_samples']
+        end = min(end, meta['n_samples'])
+        out = np.empty(max(end - start, 0), dtype=np.float64)
+        for i in range(start // chunk_samples, -(-end // chunk_samples)):
+            with np.load(f"{self.root}/{meta['dir']}/chunk_{i:05d}.npz") as chunk:
+                signal = chunk['signal']
+            chunk_start = i * chunk_samples
+            lo = max(start, chunk_start)
+            hi = min(end, chunk_start + len(signal))
+            out[lo - start: hi - start] = signal[lo - chunk_start: hi - chunk_start]
+        return out
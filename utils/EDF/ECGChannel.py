@@ -3,35 +3,46 @@ from .Epoch import Epoch
 from typing import Self
 import pandas as pd
 import numpy as np
-import wfdb.processing
-from sleepecg import detect_heartbeats
+from .BuildContext import BuildContext
 
 
 class ECGChannel(EXGChannel):
-    def get_heart_rate(self, search_radius:int=200, filter_threshold:int=200) -> Self:
+    def get_heart_rate(self, search_radius:int=200, filter_threshold:int=200, step_size:int=4) -> Self:
         """
         search_radius: search radius to look for peaks (200 ~= 150 bpm upper bound)
         filter_threshold: threshold above which to throw out values (filter_threshold=200 would throw out any value above 200 bpm and impute it from its neighbors)
-        step_size: adas
+        step_size: frequency (Hz) of the output heart rate
         """
-        rpeaks = detect_heartbeats(self.signal, self.freq)  # using sleepecg
-        rpeaks_corrected = wfdb.processing.correct_peaks(
-            self.signal, rpeaks, search_radius=search_radius, smooth_window_size=50, peak_dir="up"
-        )
-        heart_rates = [60 / ((rpeaks_corrected[i+1] - rpeaks_corrected[i]) / self.freq) for i in range(len(rpeaks_corrected) - 1)]
-        # Create a heart rate array matching the frequency of the ECG trace
-        hr_data = np.zeros_like(self.signal)
-        # Assign heart rate values to the intervals between R-peaks
-        for i in range(len(rpeaks_corrected) - 1):
-            start_idx = rpeaks_corrected[i]
-            end_idx = rpeaks_corrected[i+1]
-            hr_data[start_idx:end_idx] = heart_rates[i]
+        rpeaks_corrected = BuildContext.current().rpeak_detector.rpeaks(self, search_radius)
+        # sample positions of the output, fractional when step_size does not divide the ECG frequency
+        grid = np.arange(int(len(self.signal) * step_size / self.freq)) * (self.freq / step_size)
+        hr_data = self.heart_rate_on_grid(rpeaks_corrected, grid, filter_threshold)
+        return self._return(hr_data, step_size=step_size, method='get_heart_rate',
+                            args={'search_radius': search_radius, 'filter_threshold': filter_threshold,
+                                  'step_size': step_size})
 
-        hr_data = pd.Series(hr_data)
-        hr_data[hr_data > filter_threshold] = np.nan
-        hr_data = hr_data.interpolate(method='quadratic', order=5).fillna('ffill').fillna('bfill')
-        hr_data = hr_data.to_numpy()
-        return self._return(hr_data, step_size=self.freq)
+    def heart_rate_on_grid(self, rpeaks:np.array, grid:np.array, filter_threshold:float) -> np.array:
+        """
+        Heart rate at the sample positions of `grid`, from the RR intervals between
+        R-peaks: each position takes the rate of the interval it falls in. Rates
+        above `filter_threshold` are thrown out and, like positions before the
+        first or after the last peak, imputed linearly from the neighbouring
+        valid intervals, placed at their midpoints.
+        """
+        rpeaks = np.asarray(rpeaks)
+        with np.errstate(divide='ignore'):
+            heart_rates = 60 / (np.diff(rpeaks) / self.freq)
+        valid = heart_rates <= filter_threshold
+        if not valid.any():
+            return np.full(len(grid), np.nan)
+
+        midpoints = (rpeaks[:-1] + rpeaks[1:]) / 2
+        hr_data = np.interp(grid, midpoints[valid], heart_rates[valid])
+        interval = np.searchsorted(rpeaks, grid, side='right') - 1
+        in_interval = (interval >= 0) & (interval < len(heart_rates))
+        in_interval[in_interval] = valid[interval[in_interval]]
+        hr_data[in_interval] = heart_rates[interval[in_interval]]
+        return hr_data
     
     def get_hr_epoch(self, freq_broad:tuple[float,float]=(0, 1), window_sec:int=512, step_size:int=32) -> tuple:
         """
@@ -1,14 +1,31 @@
-from datetime import timedelta, datetime
-from typing import Self
+import os
+import math
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Self, Iterator
+import numpy as np
 import pandas as pd
 import mne
+from .LRUCache import LRUCache
+from .EDFReader import EDFReader
+from .ColumnarStore import ColumnarStore
+from .Resampling import resample_ratio, resample_signal, resample_block
 from .Channel import Channel
 from .EXGChannel import EXGChannel
 from .ECGChannel import ECGChannel
 
 
 class EDFutils:
-    def __init__(self, filepath, fetch_metadata=True, config:dict=None) -> None:
+    def __init__(self, filepath, fetch_metadata=True, config:dict=None, cache_bytes:int=0, backend:str='mne', store_dir:str=None) -> None:
+        """
+        filepath: path to the EDF file
+        fetch_metadata: read channels and timestamps from the file rather than `config`
+        config: EDF configuration of an analysis, required if `fetch_metadata` is False
+        cache_bytes: memory budget for keeping read channels around, 0 disables caching
+        backend: 'mne' to read through MNE, 'native' to memory-map the EDF with EDFReader
+        store_dir: ColumnarStore directory read instead of the EDF for the channels it holds,
+        defaults to `columnar` next to the EDF
+        """
         self._route_object = {
             'Other': Channel,
             'Gyroscope': Channel,
@@ -21,14 +38,25 @@ class EDFutils:
         self.filepath = filepath
         self.time_range = (None, None)
         self.channel_types = {}
+        self.cache = LRUCache(cache_bytes, sizeof=self._channel_nbytes)
+        if store_dir is None:
+            store_dir = os.path.join(os.path.dirname(filepath), 'columnar')
+        self.store = ColumnarStore(store_dir, filepath)
 
-        if fetch_metadata:
-            with mne.io.read_raw_edf(filepath, preload=False) as raw:
-                self.channels = raw.ch_names
-                self.start_ts = raw.info['meas_date'].replace(tzinfo=None)
-                self.end_ts = self.start_ts + timedelta(seconds=raw.times[-1])
+        if backend not in ('mne', 'native'):
+            raise ValueError(f"Only accepts mne and native backends, not {backend}")
+        self.backend = backend
+        self.reader = None
+        # MNE raws opened by read_edf_samples, one per channel so each keeps its own rate
+        self._raws = {}
+        if fetch_metadata or backend == 'native':
+            self.reader = EDFReader(filepath)
 
-            self.channel_freqs = {ch: self.get_channel_frequency(ch) for ch in self.channels}
+        if fetch_metadata:
+            self.channels = self.reader.channels
+            self.start_ts = self.reader.start_ts
+            self.end_ts = self.reader.end_ts
+            self.channel_freqs = dict(self.reader.channel_freqs)
         elif config is None:
             raise Exception("A configuration must be passed if `fetch_metadata` is set to False")
         else:
@@ -51,43 +79,173 @@ class EDFutils:
     def __getitem__(self, item) -> Channel:
         if item not in self.channels:
             raise KeyError(f"`{item}` not a channel in EDF file '{self.filepath}'")
+        key = (item, self.time_range)
+        channel = self.cache.get(key)
+        if channel is None:
+            channel = self.read_channel(item)
+            self.cache.put(key, channel)
+        return channel
+
+    def read_channel(self, item) -> Channel:
+        """
+        Reads a channel from disk, bypassing the channel cache.
+        """
+        if self.store.has(item):
+            signal = self.read_samples(item, *self.sample_bounds(item))
+        elif self.backend == 'native':
+            signal, _ = self.reader.read(item, *self.time_range) \
+                if all(self.time_range) else self.reader.read(item)
         else:
             with mne.io.read_raw_edf(self.filepath, include=[item], preload=False) as raw:
                 if all(self.time_range):
                     raw.crop(tmin=self.time_range[0], tmax=self.time_range[1])
-                signal, time = raw[0]
-
-            channel_obj = Channel
-            if self.channel_types:
-                ch_type = self.channel_types[item]
-                channel_obj = self._route_object.get(ch_type)
-                if channel_obj is None:
-                    raise Exception(f"Does not accept `{ch_type}` as channel type "
-                                    "only EEG, ECG, Motion, and Other")
-
-            return channel_obj(
-                start_ts=self.start_ts,
-                end_ts=self.end_ts,
-                name=item,
-                signal=signal[0],
-                time=time,
-                freq=self.channel_freqs[item],
-                type_=self.channel_types.get(item)
-            )
+                signal, _ = raw[0]
+            signal = signal[0]
+        return self._make_channel(item, signal)
+
+    def iter_chunks(self, channel, chunk_sec:int=3600, overlap_sec:int=60) -> Iterator[Channel]:
+        """
+        Reads a channel piece by piece so that peak memory is bounded by the
+        chunk size rather than the recording length. Each piece extends
+        `overlap_sec` past both ends of its core so that rolling windows, epochs
+        and filters see the same samples as on the full channel. Piece times are
+        relative to the start of the full channel and `piece.chunk` holds the
+        piece's `offset` and `core` as sample indices of the full channel,
+        see utils.EDF.Chunking for stitching outputs back together.
+        channel: name of the channel to read
+        chunk_sec: length of the core of each piece in seconds
+        overlap_sec: length of the context added on each side of the core in seconds
+        """
+        if channel not in self.channels:
+            raise KeyError(f"`{channel}` not a channel in EDF file '{self.filepath}'")
+        freq = self.channel_freqs[channel]
+        first, last = self.sample_bounds(channel)
+        chunk = int(chunk_sec * freq)
+        overlap = int(overlap_sec * freq)
+
+        for core_start in range(first, last, chunk):
+            core_end = min(core_start + chunk, last)
+            start = max(core_start - overlap, first)
+            end = min(core_end + overlap, last)
+            signal = self.read_samples(channel, start, end)
+            piece = self._make_channel(channel, signal, time_offset=(start - first) / freq)
+            piece.chunk = {
+                'offset': start - first,
+                'core': (core_start - first, core_end - first)
+            }
+            yield piece
+
+    def sample_bounds(self, channel) -> tuple[int, int]:
+        """
+        Sample indices [first, last) of a channel covered by the current date range.
+        """
+        reader = self.reader if self.reader is not None else EDFReader(self.filepath)
+        if all(self.time_range):
+            return reader.sample_range(channel, *self.time_range)
+        return reader.sample_range(channel)
+
+    def read_samples(self, channel, start:int, end:int) -> np.array:
+        """
+        Reads samples [start, end) of a channel from disk, indices are relative
+        to the start of the recording. Served by the ColumnarStore when it holds the channel.
+        """
+        if self.store.has(channel):
+            return self.store.read_samples(channel, start, end)
+        return self.read_edf_samples(channel, start, end)
+
+    def read_edf_samples(self, channel, start:int, end:int) -> np.array:
+        """
+        Reads samples [start, end) of a channel from the EDF itself.
+        """
+        if self.backend == 'native':
+            return self.reader.read_samples(channel, start, end)
+        # opened once and reused, block by block reads would otherwise re-parse the header each time
+        raw = self._raws.get(channel)
+        if raw is None:
+            raw = mne.io.read_raw_edf(self.filepath, include=[channel], preload=False, verbose=False)
+            self._raws[channel] = raw
+        return raw.get_data(start=start, stop=end)[0]
+
+    def _make_channel(self, item, signal, time_offset:float=0) -> Channel:
+        channel_obj = Channel
+        if self.channel_types:
+            ch_type = self.channel_types[item]
+            channel_obj = self._route_object.get(ch_type)
+            if channel_obj is None:
+                raise Exception(f"Does not accept `{ch_type}` as channel type "
+                                "only EEG, ECG, Motion, and Other")
+
+        return channel_obj(
+            start_ts=self.start_ts,
+            end_ts=self.end_ts,
+            name=item,
+            signal=signal,
+            freq=self.channel_freqs[item],
+            type_=self.channel_types.get(item),
+            time_offset=time_offset,
+            lineage={'source': self.filepath, 'source_id': self.source_id(),
+                     'channel': item, 'time_range': self.time_range}
+        )
+
+    def source_id(self) -> dict:
+        """
+        Identity of the EDF's content recorded in channel lineages, so that a
+        re-uploaded file under the same name does not match cached results of
+        the old one: the digest of the `.sha256` sidecar written on upload when
+        it exists, plus the file's size and modification time.
+        """
+        stat = os.stat(self.filepath)
+        source_id = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if os.path.exists(f'{self.filepath}.sha256'):
+            with open(f'{self.filepath}.sha256') as f:
+                source_id['sha256'] = f.read().strip()
+        return source_id
+
+    def write_store(self, channels:list=None) -> None:
+        """
+        Converts channels to the ColumnarStore, later reads of these channels skip EDF parsing.
+        channels: channels to convert, default converts all
+        """
+        self.store.write(self, channels)
+        self.cache.clear()
+
+    def release(self, item) -> None:
+        """
+        Drops a channel from the channel cache once it is no longer needed.
+        """
+        self.cache.discard((item, self.time_range))
+
+    @staticmethod
+    def _channel_nbytes(channel: Channel) -> int:
+        return channel.nbytes
         
     def get_channel_frequency(self, ch_name) -> int:
-        with mne.io.read_raw_edf(self.filepath, include=[ch_name], preload=False) as raw:
-            freq = len(raw.crop(tmin=0, tmax=1).pick(ch_name).get_data()[0])-1
-        return freq
+        """
+        Sampling frequency of a channel, derived from the EDF header's
+        samples-per-record field.
+        """
+        reader = self.reader if self.reader is not None else EDFReader(self.filepath)
+        return reader.get_channel_frequency(ch_name)
 
-    # TODO
-    def resample(self, sfreq, ch_names=None) -> Self:
+    def resample(self, sfreq, ch_names=None, n_jobs:int=None) -> Self:
         """
         Resamples the EDF file to a new sampling frequency and optionally picks specific channels
         sfreq: sampling frequency to resample to
         ch_names: list of channel names to pick (if None, all channels are picked)
+        n_jobs: number of channels resampled concurrently (if None, one per core)
         """
-        return
+        ch_names = self.channels if ch_names is None else ch_names
+        for ch in ch_names:
+            if ch not in self.channels:
+                raise KeyError(f"`{ch}` not a channel in EDF file '{self.filepath}'")
+
+        def resample_channel(ch) -> np.array:
+            return resample_signal(self.read_channel(ch).signal, self.channel_freqs[ch], sfreq)
+
+        # polyphase filtering releases the GIL, threads avoid copying signals between processes
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            signals = dict(zip(ch_names, pool.map(resample_channel, ch_names)))
+        return ResampledEDF(self, signals, sfreq)
 
     def set_date_range(self, start: datetime, end: datetime) -> None:
         """
@@ -101,11 +259,90 @@ class EDFutils:
         back = (end - self.start_ts).total_seconds()
         self.time_range = (int(front), int(back))
 
-    # TODO
-    def to_DataFrame(self, frequency:int, channels:list=None) -> pd.DataFrame:
+    def to_DataFrame(self, frequency:int, channels:list=None, path:str=None, chunk_sec:int=3600) -> pd.DataFrame|None:
         """
         Exports channels to a pandas DataFrame wherein each channel is a column.
+        Channels are resampled block by block onto one shared time index and
+        written into a preallocated float32 array.
         frequency: the desired output frequency to sample all data to
         channels: channels to export, default exports all
+        path: if given, blocks are streamed to this CSV file instead of being kept in memory
+        chunk_sec: length of each block in seconds
         """
-        pass
+        channels = self.channels if channels is None else channels
+        bounds = {ch: self.sample_bounds(ch) for ch in channels}
+        ratios = {ch: resample_ratio(self.channel_freqs[ch], frequency) for ch in channels}
+        n_out = {ch: -(-(last - first) * ratios[ch][0] // ratios[ch][1])
+                 for ch, (first, last) in bounds.items()}
+        n_rows = max(n_out.values())
+        # blocks start on a multiple of every channel's upsampling factor
+        block = int(chunk_sec * frequency)
+        block = max(block // math.lcm(*(up for up, _ in ratios.values())), 1) \
+            * math.lcm(*(up for up, _ in ratios.values()))
+
+        data = None
+        if path is None:
+            data = np.full((n_rows, len(channels)), np.nan, dtype=np.float32)
+        for out_start in range(0, n_rows, block):
+            out_end = min(out_start + block, n_rows)
+            rows = data[out_start:out_end] if path is None else \
+                np.full((out_end - out_start, len(channels)), np.nan, dtype=np.float32)
+            for i, ch in enumerate(channels):
+                first, last = bounds[ch]
+                values = resample_block(
+                    lambda start, end: self.read_samples(ch, first + start, first + end),
+                    last - first, self.channel_freqs[ch], frequency,
+                    out_start, min(out_end, n_out[ch])
+                )
+                rows[:len(values), i] = values
+
+            if path is not None:
+                rows = pd.DataFrame(rows, columns=channels)
+                rows.insert(0, 'time', np.arange(out_start, out_end) / frequency)
+                rows.to_csv(path, mode='w' if out_start == 0 else 'a',
+                            header=out_start == 0, index=False)
+        if path is not None:
+            return None
+
+        df = pd.DataFrame(data, columns=channels, copy=False)
+        df.insert(0, 'time', np.arange(n_rows) / frequency)
+        return df
+
+
+class ResampledEDF(EDFutils):
+    def __init__(self, edf: EDFutils, signals: dict, sfreq) -> None:
+        """
+        In-memory EDF produced by EDFutils.resample, channels are served from
+        the resampled signals of the date range set when resampling.
+        edf: EDFutils the signals were resampled from
+        signals: resampled signal of each picked channel
+        sfreq: sampling frequency of the resampled signals
+        """
+        self.__dict__.update(edf.__dict__)
+        sfreq = int(sfreq) if float(sfreq).is_integer() else sfreq
+        self.signals = signals
+        self.channels = list(signals)
+        self.channel_freqs = {ch: sfreq for ch in self.channels}
+        self.cache = LRUCache(0, sizeof=self._channel_nbytes)
+
+    def read_channel(self, item) -> Channel:
+        return self._make_channel(item, self.signals[item])
+
+    def sample_bounds(self, channel) -> tuple[int, int]:
+        return (0, len(self.signals[channel]))
+
+    def read_samples(self, channel, start:int, end:int) -> np.array:
+        return self.signals[channel][start:end]
+
+    def read_edf_samples(self, channel, start:int, end:int) -> np.array:
+        raise ValueError("A resampled EDF has no file to read from, use read_samples")
+
+    def get_channel_frequency(self, ch_name) -> int|float:
+        return self.channel_freqs[ch_name]
+
+    def write_store(self, channels:list=None) -> None:
+        raise ValueError("Resampled signals are kept in memory only, convert the "
+                         "original EDF to a ColumnarStore instead")
+
+    def set_date_range(self, start: datetime, end: datetime) -> None:
+        raise ValueError("Set the date range before resampling")
@@ -0,0 +1,208 @@
+import os
+import json
+import numpy as np
+from datetime import datetime, timedelta
+
+ANNOTATION_LABEL = 'EDF Annotations'
+UNIT_GAINS = {'uV': 1e-6, 'µV': 1e-6, 'μV': 1e-6, 'mV': 1e-3}
+
+
+class EDFReader:
+    def __init__(self, filepath, use_index:bool=True) -> None:
+        """
+        Native EDF/EDF+ reader. The header is parsed once and the data records
+        are memory-mapped, so only the bytes of the channels and time ranges
+        actually read are paged in from disk.
+        filepath: path to the EDF file
+        use_index: read/write the parsed header from/to a sidecar next to the EDF
+        """
+        self.filepath = filepath
+        self.index_path = f"{filepath}.index.json"
+        if not (use_index and self.read_index()):
+            self.read_header()
+            if use_index:
+                self.write_index()
+        self.records = np.memmap(
+            filepath,
+            dtype='<i2',
+            mode='r',
+            offset=self.header_bytes,
+            shape=(self.n_records, self.record_samples)
+        )
+
+    def read_header(self) -> None:
+        with open(self.filepath, 'rb') as f:
+            fixed = f.read(256)
+            if fixed[:8].strip() != b'0':
+                raise ValueError(f"'{self.filepath}' is not an EDF file (only 16 bit EDF/EDF+ supported)")
+            ns = int(fixed[252:256])
+            signal_header = f.read(256 * ns)
+
+        def fields(start, width) -> list[str]:
+            offset = start * ns
+            return [signal_header[offset + i*width: offset + (i+1)*width].decode('latin-1').strip()
+                    for i in range(ns)]
+
+        start_date = fixed[168:176].decode('latin-1')
+        start_time = fixed[176:184].decode('latin-1')
+        day, month, year = (int(i) for i in start_date.split('.'))
+        hour, minute, second = (int(i) for i in start_time.split('.'))
+        year += 1900 if year >= 85 else 2000
+
+        self.start_ts = datetime(year, month, day, hour, minute, second)
+        self.header_bytes = int(fixed[184:192])
+        self.n_records = int(fixed[236:244])
+        self.record_duration = float(fixed[244:252])
+
+        labels = fields(0, 16)
+        units = fields(96, 8)
+        physical_min = np.array(fields(104, 8), dtype=float)
+        physical_max = np.array(fields(112, 8), dtype=float)
+        digital_min = np.array(fields(120, 8), dtype=float)
+        digital_max = np.array(fields(128, 8), dtype=float)
+        samples_per_record = [int(i) for i in fields(216, 8)]
+
+        cal = (physical_max - physical_min) / (digital_max - digital_min)
+        offsets = physical_min - digital_min * cal
+        record_offsets = np.cumsum([0] + samples_per_record)
+        self.record_samples = int(record_offsets[-1])
+        if self.n_records < 0:
+            # recording in progress, infer record count from the file size
+            data_bytes = os.path.getsize(self.filepath) - self.header_bytes
+            self.n_records = data_bytes // (2 * self.record_samples)
+
+        self.layout = {}
+        for i, label in enumerate(labels):
+            if label == ANNOTATION_LABEL:
+                continue
+            self.layout[label] = {
+                'offset': int(record_offsets[i]),
+                'samples_per_record': samples_per_record[i],
+                'cal': float(cal[i]),
+                'physical_offset': float(offsets[i]),
+                'gain': UNIT_GAINS.get(units[i], 1),
+            }
+        self.channels = list(self.layout)
+        self.channel_freqs = {ch: self.get_channel_frequency(ch) for ch in self.channels}
+        max_freq = max(self.channel_freqs.values())
+        self.end_ts = self.start_ts + timedelta(
+            seconds=self.n_records*self.record_duration - 1/max_freq)
+
+    def _file_key(self) -> dict:
+        stat = os.stat(self.filepath)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def read_index(self) -> bool:
+        """
+        Loads the parsed header from the index sidecar. Returns False if the
+        sidecar is missing or was written for a different version of the file.
+        """
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if index.get('file') != self._file_key():
+            return False
+
+        self.start_ts = datetime.fromisoformat(index['start_ts'])
+        self.end_ts = datetime.fromisoformat(index['end_ts'])
+        self.header_bytes = index['header_bytes']
+        self.n_records = index['n_records']
+        self.record_duration = index['record_duration']
+        self.record_samples = index['record_samples']
+        self.layout = index['layout']
+        self.channels = index['channels']
+        self.channel_freqs = index['channel_freqs']
+        return True
+
+    def write_index(self) -> None:
+        """
+        Persists the parsed header next to the EDF, keyed by file size and
+        modification time. Failing to write it (e.g. read-only storage) is not fatal.
+        """
+        index = {
+            'file': self._file_key(),
+            'start_ts': self.start_ts.isoformat(),
+            'end_ts': self.end_ts.isoformat(),
+            'header_bytes': self.header_bytes,
+            'n_records': self.n_records,
+            'record_duration': self.record_duration,
+            'record_samples': self.record_samples,
+            'layout': self.layout,
+            'channels': self.channels,
+            'channel_freqs': self.channel_freqs,
+        }
+        try:
+            with open(self.index_path, 'w') as f:
+                json.dump(index, f, indent=4)
+        except OSError:
+            pass
+
+    def get_channel_frequency(self, ch_name) -> int|float:
+        freq = self.layout[ch_name]['samples_per_record'] / self.record_duration
+        return int(freq) if freq.is_integer() else freq
+
+    def digital(self, ch_name, first_record:int=0, last_record:int=None) -> np.ndarray:
+        """
+        Returns a (n_records, samples_per_record) view of a channel's raw
+        digital values without reading them from disk.
+        ch_name: channel to view
+        first_record: first data record of the view
+        last_record: data record at which the view stops (exclusive)
+        """
+        layout = self.layout[ch_name]
+        start = layout['offset']
+        return self.records[first_record:last_record, start:start+layout['samples_per_record']]
+
+    def sample_range(self, ch_name, tmin:float=None, tmax:float=None) -> tuple[int, int]:
+        """
+        Converts a time range to the (first, last) sample indices of a channel,
+        mirroring MNE's `crop` semantics (both `tmin` and `tmax` inclusive).
+        ch_name: channel the range applies to
+        tmin: start of the range in seconds from the recording start
+        tmax: end of the range in seconds from the recording start
+        """
+        freq = self.channel_freqs[ch_name]
+        n_samples = self.n_records * self.layout[ch_name]['samples_per_record']
+        first = 0 if tmin is None else max(int(np.ceil(tmin * freq)), 0)
+        last = n_samples if tmax is None else min(int(np.floor(tmax * freq)) + 1, n_samples)
+        return (first, last)
+
+    def read_samples(self, ch_name, first:int, last:int) -> np.ndarray:
+        """
+        Reads samples [first, last) of a channel in physical units. Only the
+        data records overlapping the requested samples are touched.
+        ch_name: channel to read
+        first: index of the first sample
+        last: index of the sample at which reading stops (exclusive)
+        """
+        if ch_name not in self.layout:
+            raise KeyError(f"`{ch_name}` not a channel in EDF file '{self.filepath}'")
+        layout = self.layout[ch_name]
+        spr = layout['samples_per_record']
+        first_record = first // spr
+        last_record = -(-last // spr)
+
+        digital = self.digital(ch_name, first_record, last_record).reshape(-1)
+        digital = digital[first - first_record*spr: last - first_record*spr]
+
+        signal = digital * layout['cal']
+        signal += layout['physical_offset']
+        signal *= layout['gain']
+        return signal
+
+    def read(self, ch_name, tmin:float=None, tmax:float=None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Reads a channel in physical units, time is relative to `tmin` as with
+        a cropped MNE Raw object.
+        ch_name: channel to read
+        tmin: start of the range in seconds from the recording start
+        tmax: end of the range in seconds from the recording start
+        """
+        first, last = self.sample_range(ch_name, tmin, tmax)
+        signal = self.read_samples(ch_name, first, last)
+        time = np.arange(len(signal)) / self.channel_freqs[ch_name]
+        return (signal, time)
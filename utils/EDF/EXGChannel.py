@@ -1,9 +1,8 @@
 from .Channel import Channel
-from .Epoch import Epoch
+from .Epoch import Epoch, sliding_epochs
+from .BuildContext import BuildContext
 import pandas as pd
 import numpy as np
-import mne
-import yasa
 
 
 
@@ -23,14 +22,8 @@ class EXGChannel(Channel):
         window_sec: size of the epoch rolling window to use in seconds
         step_size: how big of a step size to use, in seconds
         """
-        dt_filt = mne.filter.filter_data(
-            self.signal, self.freq, 
-            l_freq=freq_broad[0], h_freq=freq_broad[1], verbose=False
-        )
-        times, epochs = yasa.sliding_window(
-            dt_filt, sf=self.freq, 
-            window=window_sec, step=step_size
-        )
+        dt_filt = BuildContext.current().filter_cache.filter_data(self, *freq_broad)
+        times, epochs = sliding_epochs(dt_filt, self.freq, window_sec, step_size)
         # add window/2 to the times to make the epochs "centered" around the times
         times = times + window_sec // 2 
         return (times, epochs)
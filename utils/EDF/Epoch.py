@@ -1,13 +1,66 @@
 import numpy as np
 import pandas as pd
 import antropy
-import mne
-import yasa
-from scipy.stats import iqr, skew, kurtosis
+from functools import partial
+from typing import Callable, Iterator
 from utils.EDF.SpectralDensity import SpectralDensity
 from .Base import Base
+from .Complexity import perm_entropy, higuchi_fd
+from .BuildContext import BuildContext
 from .constants import EEG_BANDS, HR_BANDS
 
+# upper bound on the samples copied at once when a kernel needs contiguous epochs
+BLOCK_SAMPLES = 2**22
+
+
+def sliding_epochs(signal: np.array, freq: float, window_sec: int, step_size: int) -> tuple[np.array, np.array]:
+    """
+    Same epochs and times as yasa.sliding_window, but the epochs are a read-only
+    strided view of `signal`: overlapping epochs share memory instead of
+    storing every sample window_sec / step_size times.
+    signal: 1D signal to cut into epochs
+    freq: sampling frequency of the signal
+    window_sec: size of the epoch window in seconds
+    step_size: step between epochs in seconds
+    """
+    window = int(window_sec * freq)
+    step = int(step_size * freq)
+    if len(signal) < window:
+        epochs = np.empty((0, window), dtype=signal.dtype)
+    else:
+        epochs = np.lib.stride_tricks.sliding_window_view(signal, window)[::step]
+    times = np.arange(len(epochs)) * (step / freq)
+    return (times, epochs)
+
+
+def summary_stats(epochs: np.array) -> tuple[np.array, ...]:
+    """
+    Standard deviation (ddof=1), interquartile range, skewness, excess kurtosis
+    and number of zero crossings of every row of `epochs` in one sweep: the
+    central moments share one deviation array and both quartiles come from a
+    single partition. Matches np.std, scipy.stats' iqr, skew and kurtosis and
+    antropy.num_zerocross.
+    epochs: 2D array with one epoch per row
+    """
+    n = epochs.shape[1]
+    mean = epochs.mean(axis=1, keepdims=True)
+    deviation = epochs - mean
+    squared = deviation * deviation
+    m2 = squared.sum(axis=1)
+    m3 = (squared * deviation).sum(axis=1) / n
+    m4 = (squared * squared).sum(axis=1) / n
+    std = np.sqrt(m2 / (n - 1))
+    m2 /= n
+    q25, q75 = np.percentile(epochs, [25, 75], axis=1)
+    signs = np.signbit(epochs)
+    nzc = (signs[:, 1:] != signs[:, :-1]).sum(axis=1)
+    with np.errstate(all='ignore'):
+        # constant epochs have no defined skewness or kurtosis, as in scipy
+        flat = m2 <= (np.finfo(m2.dtype).eps * mean[:, 0]) ** 2
+        skew_ = np.where(flat, np.nan, m3 / m2 ** 1.5)
+        kurt = np.where(flat, np.nan, m4 / m2 ** 2.0) - 3
+    return (std, q75 - q25, skew_, kurt, nzc)
+
 
 class Epoch(Base):
     def __init__(self, channel, freq_broad:tuple[float,float], window_sec:int, step_size:int) -> None:
@@ -16,23 +69,55 @@ class Epoch(Base):
         self.window_sec = window_sec
         self.step_size = step_size
         self.times, self.epochs = self.build_epoch()
+        self._summary = None
+        self._spectral_densities = {}
 
     def build_epoch(self) -> tuple[np.array, np.array]:
-        dt_filt = mne.filter.filter_data(
-            self.from_channel.signal,
-            self.from_channel.freq, 
-            l_freq=self.freq_broad[0],
-            h_freq=self.freq_broad[1],
-            verbose=False
-        )
-        times, epochs = yasa.sliding_window(
-            dt_filt, sf=self.from_channel.freq, 
-            window=self.window_sec, step=self.step_size
+        dt_filt = BuildContext.current().filter_cache.filter_data(self.from_channel, *self.freq_broad)
+        times, epochs = sliding_epochs(
+            dt_filt, self.from_channel.freq, self.window_sec, self.step_size
         )
         # add window/2 to the times to make the epochs "centered" around the times
         times = times + self.window_sec // 2 
         return (times, epochs)
+
+    def block_rows(self, block_samples:int=BLOCK_SAMPLES) -> int:
+        """
+        Number of epochs in a block of at most `block_samples` samples (at least one).
+        """
+        return max(block_samples // max(self.epochs.shape[1], 1), 1)
+
+    def iter_blocks(self, block_samples:int=BLOCK_SAMPLES) -> Iterator[np.array]:
+        """
+        Yields consecutive blocks of epochs as contiguous copies, each holding
+        at most `block_samples` samples (and at least one epoch).
+        """
+        block = self.block_rows(block_samples)
+        for start in range(0, len(self.epochs), block):
+            yield np.ascontiguousarray(self.epochs[start: start + block])
+
+    def map_blocks(self, kernel: Callable) -> np.array:
+        """
+        Runs a per-epoch kernel (epochs in rows) block by block so that its
+        temporaries stay bounded, concatenating the per-epoch results. Blocks
+        run in parallel on the build's EpochPool, so the kernel must be picklable.
+        """
+        results = BuildContext.current().epoch_pool.map(self.epochs, kernel, self.block_rows())
+        if not results:
+            return kernel(np.ascontiguousarray(self.epochs))
+        if isinstance(results[0], tuple):
+            return tuple(np.concatenate(parts) for parts in zip(*results))
+        return np.concatenate(results)
     
+    def summary(self) -> dict:
+        """
+        Memoized summary_stats of the epochs, computed block by block.
+        """
+        if self._summary is None:
+            names = ('epoch_std', 'epoch_iqr', 'epoch_skew', 'epoch_kurtosis', 'epoch_n_zero_crossings')
+            self._summary = dict(zip(names, self.map_blocks(summary_stats)))
+        return self._summary
+
     def make_dataframe(self, feature: dict) -> pd.DataFrame:
         return pd.DataFrame.from_dict(
             {
@@ -42,56 +127,60 @@ class Epoch(Base):
         )
 
     def get_hjorth_params(self) -> dict:
-        mobility, complexity = antropy.hjorth_params(self.epochs, axis=1)
+        mobility, complexity = self.map_blocks(partial(antropy.hjorth_params, axis=1))
         return {
             'hjorth_mobility': mobility,
             'hjorth_complexity': complexity
         }
     
     def get_permutation_entropy(self) -> dict:
-        perm_ent = np.apply_along_axis(antropy.perm_entropy, axis=1, arr=self.epochs, normalize=True)
+        perm_ent = self.map_blocks(partial(perm_entropy, normalize=True))
         return {'permutation_entropy': perm_ent}
     
     def get_higuchi(self) -> dict:
-        higuchi = np.apply_along_axis(antropy.higuchi_fd, axis=1, arr=self.epochs)
+        higuchi = self.map_blocks(higuchi_fd)
         return {'higuchi_fractal_dimension': higuchi}
     
     def get_petrosian(self) -> dict:
-        petrosian = antropy.petrosian_fd(self.epochs, axis=1)
+        petrosian = self.map_blocks(partial(antropy.petrosian_fd, axis=1))
         return {'petrosian_fractal_dimension': petrosian}
 
     def get_std(self) -> dict: 
-        std = np.std(self.epochs, ddof=1, axis=1)
-        return {'epoch_std': std}
+        return {'epoch_std': self.summary()['epoch_std']}
     
     def get_interquartile_range(self) -> dict: 
-        iqr_ = iqr(self.epochs, rng=(25, 75), axis=1)
-        return {'epoch_iqr': iqr_}
+        return {'epoch_iqr': self.summary()['epoch_iqr']}
     
     def get_skew(self) -> dict: 
-        skew_ = skew(self.epochs, axis=1)
-        return {'epoch_skew': skew_}
+        return {'epoch_skew': self.summary()['epoch_skew']}
     
     def get_kurtosis(self) -> dict: 
-        kurt = kurtosis(self.epochs, axis=1)
-        return {'epoch_kurtosis': kurt}
+        return {'epoch_kurtosis': self.summary()['epoch_kurtosis']}
     
     def get_zero_crossings(self) -> np.array: 
-        nzc = antropy.num_zerocross(self.epochs, axis=1)
-        return {'epoch_n_zero_crossings': nzc}
+        return {'epoch_n_zero_crossings': self.summary()['epoch_n_zero_crossings']}
     
+    def spectral_density(self, window_sec:int, bands:list[tuple[float, float, str]]) -> SpectralDensity:
+        """
+        SpectralDensity of the epochs, memoized per window and band definition.
+        """
+        key = (window_sec, tuple(tuple(band) for band in bands))
+        if key not in self._spectral_densities:
+            self._spectral_densities[key] = SpectralDensity(self, window_sec, bands)
+        return self._spectral_densities[key]
+
     def get_welch(self, window_sec:int=4, bands:list[tuple[float, float, str]]=EEG_BANDS) -> SpectralDensity:
         """
         window_sec: size of the rolling window to use in seconds
         bands: band ranges and their name from which to calculate the spectral density
         """
-        return SpectralDensity(self, window_sec, bands)
+        return self.spectral_density(window_sec, bands)
     
     def get_hr_welch(self, window_sec:int=512, bands:list[tuple[float, float, str]]=HR_BANDS) -> SpectralDensity:
         """
         window_sec: size of the rolling window to use in seconds
         bands: band ranges and their name from which to calculate the spectral density
         """
-        return SpectralDensity(self, window_sec, bands)
+        return self.spectral_density(window_sec, bands)
 
-        
\ No newline at end of file
+        
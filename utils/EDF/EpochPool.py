@@ -0,0 +1,137 @@
+import os
+import threading
+import multiprocessing
+import numba
+import numpy as np
+from threadpoolctl import threadpool_limits
+from typing import Callable
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from numpy.lib.stride_tricks import as_strided
+
+
+def _shareable_span(epochs: np.array) -> tuple[np.array, tuple[int, int]]:
+    """
+    Smallest 1D array the epochs can be rebuilt from, with the strides to
+    rebuild them. For the strided views of Epoch this is the span of signal
+    they cover rather than the window_sec / step_size times larger matrix.
+    """
+    itemsize = epochs.itemsize
+    row_stride, col_stride = epochs.strides
+    if len(epochs) and col_stride == itemsize and row_stride >= 0 and row_stride % itemsize == 0:
+        n_rows, n_cols = epochs.shape
+        span = ((n_rows - 1) * row_stride) // itemsize + n_cols
+        return (as_strided(epochs, shape=(span,), strides=(itemsize,)), epochs.strides)
+    contiguous = np.ascontiguousarray(epochs)
+    return (contiguous.ravel(), contiguous.strides)
+
+
+def _run_block(shm_name: str, dtype: str, span: int, shape: tuple, strides: tuple,
+               start: int, stop: int, kernel: Callable):
+    """
+    Worker side of EpochPool.map: rebuilds the epochs from shared memory and
+    runs the kernel on a contiguous copy of rows [start, stop).
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        flat = np.ndarray((span,), dtype=dtype, buffer=shm.buf)
+        block = np.ascontiguousarray(as_strided(flat, shape=shape, strides=strides)[start:stop])
+        del flat
+        return kernel(block)
+    finally:
+        shm.close()
+
+
+def _limit_threads() -> None:
+    """
+    Worker initializer of EpochPool: one thread per worker for numba, OpenMP
+    and BLAS, as the pool already runs one worker per core and nested
+    threading would oversubscribe them (cores * cores threads).
+    """
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = '1'
+    # libraries loaded while unpickling the initializer already read the variables
+    threadpool_limits(1)
+    numba.set_num_threads(1)
+
+
+class EpochPool:
+    def __init__(self, n_jobs:int=None) -> None:
+        """
+        Process pool running Epoch kernels over blocks of epochs in parallel.
+        The signal the epochs are cut from is placed in shared memory once per
+        call, workers rebuild the epochs from it instead of receiving a pickled
+        copy, and only the per-epoch results travel back. Other chunked work
+        of a build (e.g. R-peak detection) runs on the same workers via starmap.
+        n_jobs: number of worker processes, None uses every core, 1 runs in the calling process
+        """
+        self.n_jobs = n_jobs
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self) -> int:
+        return self.n_jobs if self.n_jobs is not None else (os.cpu_count() or 1)
+
+    def shutdown(self) -> None:
+        """
+        Stops the worker processes, e.g. at the end of a build. They are
+        started again on the next parallel call.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawned rather than forked, the parent may hold numba or BLAS threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_limit_threads
+                )
+            return self._executor
+
+    def starmap(self, func: Callable, args_list: list[tuple]) -> list:
+        """
+        Results of func(*args) for every args of args_list, in order. The
+        function and its arguments must be picklable.
+        """
+        if self.workers <= 1 or len(args_list) <= 1:
+            return [func(*args) for args in args_list]
+        executor = self._get_executor()
+        futures = [executor.submit(func, *args) for args in args_list]
+        return [future.result() for future in futures]
+
+    def map(self, epochs: np.array, kernel: Callable, block_rows: int) -> list:
+        """
+        Results of `kernel` on consecutive blocks of `block_rows` epochs, in order.
+        The kernel must be picklable (a module level function or a partial of one).
+        epochs: 2D array with one epoch per row
+        kernel: function of a contiguous block of epochs
+        block_rows: number of epochs per block
+        """
+        bounds = [(start, min(start + block_rows, len(epochs)))
+                  for start in range(0, len(epochs), block_rows)]
+        if self.workers <= 1 or len(bounds) <= 1:
+            return [kernel(np.ascontiguousarray(epochs[start:stop])) for start, stop in bounds]
+
+        flat, strides = _shareable_span(epochs)
+        shm = shared_memory.SharedMemory(create=True, size=flat.nbytes)
+        try:
+            np.ndarray(flat.shape, dtype=flat.dtype, buffer=shm.buf)[:] = flat
+            executor = self._get_executor()
+            futures = [
+                executor.submit(_run_block, shm.name, flat.dtype.str, len(flat),
+                                epochs.shape, strides, start, stop, kernel)
+                for start, stop in bounds
+            ]
+            return [future.result() for future in futures]
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+epoch_pool = EpochPool()
@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+import mne
+from .LRUCache import LRUCache
+
+
+class FilterCache:
+    def __init__(self, max_bytes:int=2 * 1024**3, spill_dir:str=None) -> None:
+        """
+        Bandpass-filtered signals shared by every Epoch built from the same
+        channel, keyed by the channel's lineage (source, time range and
+        derivation) and the filter parameters. Channels without a source
+        lineage are filtered without caching. Kept in memory up to `max_bytes`,
+        and optionally written to `spill_dir` so later builds can reuse them.
+        max_bytes: memory budget of the in-memory cache
+        spill_dir: directory to persist filtered signals to, None keeps them in memory only
+        """
+        self.memory = LRUCache(max_bytes)
+        self.spill_dir = spill_dir
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(channel, l_freq, h_freq) -> str:
+        key = json.dumps([channel.lineage_key(), l_freq, h_freq], default=str)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def filter_data(self, channel, l_freq, h_freq) -> np.array:
+        """
+        Returns the channel's signal bandpass filtered with MNE, computing it only
+        if it is neither in memory nor spilled to disk. The array is read-only
+        as it is shared between callers.
+        channel: Channel to filter
+        l_freq: low cut-off frequency
+        h_freq: high cut-off frequency
+        """
+        if not channel.has_source():
+            return mne.filter.filter_data(
+                channel.signal, channel.freq,
+                l_freq=l_freq, h_freq=h_freq, verbose=False
+            )
+        key = self.make_key(channel, l_freq, h_freq)
+        with self._lock:
+            filtered = self.memory.get(key)
+        if filtered is not None:
+            return filtered
+
+        spill_path = f"{self.spill_dir}/{key}.npy" if self.spill_dir else None
+        if spill_path is not None and os.path.exists(spill_path):
+            filtered = np.load(spill_path, mmap_mode='r')
+        else:
+            filtered = mne.filter.filter_data(
+                channel.signal, channel.freq,
+                l_freq=l_freq, h_freq=h_freq, verbose=False
+            )
+            filtered.flags.writeable = False
+            if spill_path is not None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                np.save(f"{spill_path}.part.npy", filtered)
+                os.replace(f"{spill_path}.part.npy", spill_path)
+
+        with self._lock:
+            self.memory.put(key, filtered)
+        return filtered
+
+
+filter_cache = FilterCache()
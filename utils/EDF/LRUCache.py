@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+
+class LRUCache:
+    def __init__(self, max_bytes:int, sizeof:Callable=None) -> None:
+        """
+        Least-recently-used store bounded by the summed size of its values.
+        max_bytes: memory budget, the oldest entries are evicted once exceeded
+        sizeof: callable returning the size in bytes of a stored value
+        """
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof if sizeof is not None else lambda value: value.nbytes
+        self.nbytes = 0
+        self._store = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._store
+
+    def __len__(self) -> int:
+        return len(self._store)
+
+    def get(self, key: Hashable, default=None):
+        if key not in self._store:
+            return default
+        self._store.move_to_end(key)
+        return self._store[key][0]
+
+    def put(self, key: Hashable, value) -> None:
+        """
+        Stores a value, evicting least recently used entries until the budget
+        is respected. Values larger than the whole budget are not stored.
+        """
+        self.discard(key)
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        self._store[key] = (value, size)
+        self.nbytes += size
+        self._evict()
+
+    def resize(self, max_bytes:int) -> None:
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.nbytes > self.max_bytes:
+            _, (_, evicted_size) = self._store.popitem(last=False)
+            self.nbytes -= evicted_size
+
+    def discard(self, key: Hashable) -> None:
+        if key in self._store:
+            _, size = self._store.pop(key)
+            self.nbytes -= size
+
+    def clear(self) -> None:
+        self._store.clear()
+        self.nbytes = 0
@@ -0,0 +1,179 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import wfdb.processing
+from sleepecg import detect_heartbeats
+from .EpochPool import EpochPool, epoch_pool
+from .LRUCache import LRUCache
+
+
+def detect_rpeaks(signal: np.array, freq: float, search_radius: int) -> tuple[np.array, np.array]:
+    """
+    R-peaks of an ECG signal as detected by sleepecg, and the same peaks
+    corrected to the local maximum by wfdb. Both arrays are aligned.
+    signal: ECG signal
+    freq: sampling frequency of the signal
+    search_radius: search radius of the correction in samples
+    """
+    rpeaks = detect_heartbeats(signal, freq)
+    if not len(rpeaks):
+        return (rpeaks, rpeaks)
+    rpeaks_corrected = wfdb.processing.correct_peaks(
+        signal, rpeaks, search_radius=search_radius, smooth_window_size=50, peak_dir="up"
+    )
+    return (rpeaks, rpeaks_corrected)
+
+
+def _detect_core(signal: np.array, freq: float, search_radius: int, core_start: int, core_end: int) -> np.array:
+    """
+    Corrected R-peaks of a piece of signal whose detected (uncorrected) peak
+    falls in [core_start, core_end), relative to the start of the piece.
+    """
+    rpeaks, rpeaks_corrected = detect_rpeaks(signal, freq, search_radius)
+    return rpeaks_corrected[(rpeaks >= core_start) & (rpeaks < core_end)]
+
+
+def dedup_rpeaks(rpeaks: np.array, min_gap: int) -> np.array:
+    """
+    Sorted R-peaks without repeats, dropping every peak closer than `min_gap`
+    samples to the last peak kept. Corrected peaks of neighbouring chunks, or
+    neighbouring detections corrected to the same maximum, can coincide.
+    rpeaks: R-peak sample indices
+    min_gap: minimum number of samples between two peaks
+    """
+    rpeaks = np.unique(rpeaks)
+    if len(rpeaks) < 2 or np.diff(rpeaks).min() >= min_gap:
+        return rpeaks
+    keep = np.ones(len(rpeaks), dtype=bool)
+    last = rpeaks[0]
+    for i in range(1, len(rpeaks)):
+        if rpeaks[i] - last < min_gap:
+            keep[i] = False
+        else:
+            last = rpeaks[i]
+    return rpeaks[keep]
+
+
+class RPeakDetector:
+    def __init__(self, chunk_sec:int=3600, overlap_sec:int=60, checkpoint_dir:str=None,
+                 index_dir:str=None, max_bytes:int=256 * 1024**2, pool:EpochPool=None,
+                 min_gap_sec:float=0.2) -> None:
+        """
+        Detects R-peaks over overlapping chunks of an ECG on an EpochPool. Each
+        chunk keeps the peaks detected in its core, corrected within the chunk,
+        so the merged peaks are those of a single pass over the whole signal as
+        long as the overlap covers the settling time of the detector's filters
+        and thresholds. The peaks of every finished chunk are checkpointed to
+        `checkpoint_dir`, so an interrupted detection resumes where it stopped.
+        Finished detections are kept in memory and in `index_dir`, keyed by the
+        channel's lineage (source, time range and derivation) and search radius,
+        so every feature derived from the same ECG detects its peaks only once.
+        Channels without a source lineage are detected without caching or checkpoints.
+        chunk_sec: length of the core of each chunk in seconds
+        overlap_sec: signal added on both sides of each core in seconds
+        checkpoint_dir: directory of the chunk checkpoints, None disables them
+        index_dir: directory of the finished R-peak indices, None keeps them in memory only
+        max_bytes: memory budget of the in-memory R-peak indices
+        pool: EpochPool running the chunks, defaults to epoch_pool
+        min_gap_sec: merged peaks closer than this are dropped, defaults to the
+        detector's 200 ms refractory period
+        """
+        self.chunk_sec = chunk_sec
+        self.overlap_sec = overlap_sec
+        self.checkpoint_dir = checkpoint_dir
+        self.index_dir = index_dir
+        self.memory = LRUCache(max_bytes)
+        self.pool = pool if pool is not None else epoch_pool
+        self.min_gap_sec = min_gap_sec
+
+    @staticmethod
+    def make_key(channel, search_radius: int, min_gap_sec: float) -> str:
+        key = json.dumps([channel.lineage_key(), search_radius, min_gap_sec], default=str)
+        return hashlib.sha1(key.encode()).hexdigest()
+
+    def rpeaks(self, channel, search_radius: int) -> np.array:
+        """
+        Corrected R-peak sample indices of an ECG channel, detected only if they
+        are neither in memory nor in the index directory. The array is
+        read-only as it is shared between callers.
+        channel: ECG Channel
+        search_radius: search radius of the peak correction in samples
+        """
+        if not channel.has_source():
+            return self.detect(channel, search_radius)
+        key = self.make_key(channel, search_radius, self.min_gap_sec)
+        rpeaks = self.memory.get(key)
+        if rpeaks is not None:
+            return rpeaks
+
+        index_path = f"{self.index_dir}/{key}.npy" if self.index_dir else None
+        if index_path is not None and os.path.exists(index_path):
+            rpeaks = np.load(index_path)
+        else:
+            rpeaks = self.detect(channel, search_radius)
+            if index_path is not None:
+                os.makedirs(self.index_dir, exist_ok=True)
+                np.save(f"{index_path}.tmp.npy", rpeaks)
+                os.replace(f"{index_path}.tmp.npy", index_path)
+                if self.checkpoint_dir is not None:
+                    shutil.rmtree(self._checkpoint_path(key), ignore_errors=True)
+        rpeaks.flags.writeable = False
+        self.memory.put(key, rpeaks)
+        return rpeaks
+
+    def _checkpoint_path(self, key: str) -> str:
+        return f"{self.checkpoint_dir}/{key}_{self.chunk_sec}_{self.overlap_sec}"
+
+    def detect(self, channel, search_radius: int) -> np.array:
+        """
+        Corrected R-peak sample indices of an ECG channel, detected chunk by
+        chunk without reading or writing the index (see rpeaks), merged with
+        dedup_rpeaks.
+        channel: ECG Channel
+        search_radius: search radius of the peak correction in samples
+        """
+        n_samples = len(channel.signal)
+        chunk = int(self.chunk_sec * channel.freq)
+        overlap = int(self.overlap_sec * channel.freq)
+        cores = [(start, min(start + chunk, n_samples)) for start in range(0, n_samples, chunk)]
+
+        checkpoint = None
+        if self.checkpoint_dir is not None and channel.has_source():
+            checkpoint = self._checkpoint_path(self.make_key(channel, search_radius, self.min_gap_sec))
+            os.makedirs(checkpoint, exist_ok=True)
+        paths = [f"{checkpoint}/chunk_{i:05d}.npy" if checkpoint else None for i in range(len(cores))]
+
+        def piece(i: int) -> tuple:
+            core_start, core_end = cores[i]
+            start = max(core_start - overlap, 0)
+            end = min(core_end + overlap, n_samples)
+            return (channel.signal[start:end], channel.freq, search_radius,
+                    core_start - start, core_end - start)
+
+        peaks = {}
+        pending = []
+        for i, path in enumerate(paths):
+            if path is not None and os.path.exists(path):
+                peaks[i] = np.load(path)
+            else:
+                pending.append(i)
+        # one chunk per worker at a time, checkpointing each batch as it finishes
+        batch = self.pool.workers
+        for b in range(0, len(pending), batch):
+            batch_ids = pending[b: b + batch]
+            results = self.pool.starmap(_detect_core, [piece(i) for i in batch_ids])
+            for i, chunk_peaks in zip(batch_ids, results):
+                peaks[i] = chunk_peaks + max(cores[i][0] - overlap, 0)
+                if paths[i] is not None:
+                    # written under a temporary name so that a partial file is never resumed from
+                    np.save(f"{paths[i]}.tmp.npy", peaks[i])
+                    os.replace(f"{paths[i]}.tmp.npy", paths[i])
+        if not peaks:
+            return np.array([], dtype=int)
+        rpeaks = np.concatenate([peaks[i] for i in range(len(cores))])
+        return dedup_rpeaks(rpeaks, int(self.min_gap_sec * channel.freq))
+
+
+rpeak_detector = RPeakDetector()
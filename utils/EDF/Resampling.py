@@ -0,0 +1,107 @@
+import numpy as np
+from fractions import Fraction
+from typing import Callable
+from scipy.signal import resample_poly, decimate
+
+
+def resample_ratio(freq: float, sfreq: float, max_denominator:int=1000) -> tuple[int, int]:
+    """
+    Rational (up, down) factors taking `freq` to `sfreq`.
+    freq: original sampling frequency
+    sfreq: target sampling frequency
+    max_denominator: bound on the factors for irrational-looking ratios
+    """
+    ratio = Fraction(sfreq / freq).limit_denominator(max_denominator)
+    return (ratio.numerator, ratio.denominator)
+
+
+def resample_signal(signal: np.array, freq: float, sfreq: float) -> np.array:
+    """
+    Resamples a signal with polyphase filtering, the FIR low-pass of
+    `resample_poly` removes content above the new Nyquist before decimating.
+    signal: signal to resample
+    freq: original sampling frequency
+    sfreq: target sampling frequency
+    """
+    up, down = resample_ratio(freq, sfreq)
+    if up == down:
+        return np.asarray(signal, dtype=float)
+    return resample_poly(signal, up, down)
+
+
+def resample_block(read: Callable, n_samples: int, freq: float, sfreq: float,
+                   out_start: int, out_end: int) -> np.array:
+    """
+    Computes output samples [out_start, out_end) of `resample_signal` while
+    reading only the input span they depend on. The span is padded by the
+    polyphase filter's half length so the block matches resampling the whole
+    signal. `out_start` must be a multiple of the upsampling factor.
+    read: callable returning input samples [start, end)
+    n_samples: length of the input signal
+    freq: original sampling frequency
+    sfreq: target sampling frequency
+    out_start: first output sample of the block
+    out_end: output sample at which the block stops (exclusive)
+    """
+    up, down = resample_ratio(freq, sfreq)
+    if up == down:
+        return np.asarray(read(out_start, min(out_end, n_samples)), dtype=float)
+    if out_start % up:
+        raise ValueError(f"Block must start on a multiple of the upsampling factor ({up})")
+
+    # same filter half length as resample_poly, rounded up to whole input periods of `down`
+    half_len = 10 * max(up, down)
+    pad = (-(-half_len // up) // down + 1) * down
+    in_start = max(out_start // up * down - pad, 0)
+    in_end = min(-(-out_end * down // up) + pad, n_samples)
+
+    resampled = resample_poly(read(in_start, in_end), up, down)
+    offset = in_start * up // down
+    return resampled[out_start - offset: out_end - offset]
+
+
+def decimation_stages(factor: int, max_stage:int=10) -> list[int]:
+    """
+    Splits an integer decimation factor into stages no larger than `max_stage`
+    where possible (a prime factor above it becomes its own stage), since
+    scipy's decimate filters poorly for factors above 13.
+    factor: overall decimation factor
+    max_stage: largest factor of a single stage
+    """
+    primes = []
+    remainder, p = factor, 2
+    while p * p <= remainder:
+        while remainder % p == 0:
+            primes.append(p)
+            remainder //= p
+        p += 1
+    if remainder > 1:
+        primes.append(remainder)
+
+    stages = []
+    for prime in sorted(primes, reverse=True):
+        for i, stage in enumerate(stages):
+            if stage * prime <= max_stage:
+                stages[i] *= prime
+                break
+        else:
+            stages.append(prime)
+    return sorted(stages, reverse=True)
+
+
+def decimate_signal(signal: np.array, freq: float, sfreq: float, ftype:str='fir') -> np.array:
+    """
+    Low-pass filters and downsamples a signal. Integer ratios are decimated in
+    stages with zero-phase filters, other ratios fall back to polyphase resampling.
+    signal: signal to decimate
+    freq: original sampling frequency
+    sfreq: target sampling frequency
+    ftype: 'fir' or 'iir' anti-aliasing filter for integer ratios
+    """
+    factor = freq / sfreq
+    if not float(factor).is_integer():
+        return resample_signal(signal, freq, sfreq)
+    decimated = np.asarray(signal, dtype=float)
+    for stage in decimation_stages(int(factor)):
+        decimated = decimate(decimated, stage, ftype=ftype, zero_phase=True)
+    return decimated
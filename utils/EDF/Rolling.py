@@ -0,0 +1,149 @@
+import numpy as np
+from typing import Callable
+from numpy.lib.stride_tricks import sliding_window_view
+
+CUMULATIVE_REDUCERS = ('sum', 'mean', 'var', 'std')
+# below this many samples, reducing the windows directly is cheap and avoids cancellation
+SHORT_WINDOW = 64
+# number of samples of windows handed to a reducer at once
+BLOCK_SAMPLES = 2**22
+WINDOW_REDUCERS = {
+    'sum': lambda windows, q: np.sum(windows, axis=1),
+    'mean': lambda windows, q: np.mean(windows, axis=1),
+    'var': lambda windows, q: np.var(windows, axis=1, ddof=1),
+    'std': lambda windows, q: np.std(windows, axis=1, ddof=1),
+    'min': lambda windows, q: np.min(windows, axis=1),
+    'max': lambda windows, q: np.max(windows, axis=1),
+    'median': lambda windows, q: np.median(windows, axis=1),
+    'quantile': lambda windows, q: np.quantile(windows, q, axis=1),
+}
+
+
+def window_bounds(n_samples: int, window: int, stride: int, center:bool=True) -> tuple[np.array, np.array]:
+    """
+    Start index of the window of every output point and whether that window
+    lies fully inside the signal. Output points are every `stride` samples from
+    the first sample, windows are placed as in pandas' `rolling`. A fractional
+    stride (output frequencies not dividing the signal's) places each output
+    point on the sample at or before its exact position, so the outputs stay
+    on the grid of the output frequency instead of drifting.
+    n_samples: length of the signal
+    window: window length in samples
+    stride: samples between output points
+    center: center windows on their output point, else windows end on it
+    """
+    # the tolerance keeps exact positions like 3 * (100 / 3) from flooring a sample short
+    positions = np.floor(np.arange(0, n_samples, stride) + 1e-9).astype(int)
+    starts = positions - window // 2 if center else positions - window + 1
+    valid = (starts >= 0) & (starts + window <= n_samples)
+    return (starts, valid)
+
+
+def _window_sums(signal: np.array, window: int, starts: np.array) -> tuple[np.array, np.array, np.array]:
+    """
+    Sum and sum of squares of each window about a nearby shift, from prefix
+    sums. Prefix sums restart every block of at least `window` samples and are
+    taken about the block's first sample, so their magnitude stays local and a
+    window spans at most two blocks, whose sums are moved to a common shift.
+    Returns (shift, sum, sum of squares) per window, the sums being of `signal - shift`.
+    """
+    block = max(window, SHORT_WINDOW)
+    n_blocks = -(-len(signal) // block)
+    blocks = np.zeros((n_blocks, block))
+    blocks.reshape(-1)[:len(signal)] = signal
+    shifts = blocks[:, 0].copy()
+    centered = blocks - shifts[:, None]
+    prefix = np.zeros((n_blocks, block + 1))
+    prefix_sq = np.zeros((n_blocks, block + 1))
+    np.cumsum(centered, axis=1, out=prefix[:, 1:])
+    np.cumsum(centered**2, axis=1, out=prefix_sq[:, 1:])
+
+    ends = starts + window
+    first_block, first_idx = np.divmod(starts, block)
+    last_block = (ends - 1) // block
+    last_idx = ends - last_block * block
+    same = first_block == last_block
+
+    head_end = np.where(same, last_idx, block)
+    sums = prefix[first_block, head_end] - prefix[first_block, first_idx]
+    sums_sq = prefix_sq[first_block, head_end] - prefix_sq[first_block, first_idx]
+
+    # part of the window in the next block, moved from that block's shift to the first's
+    n_tail = np.where(same, 0, last_idx)
+    tail = prefix[last_block, n_tail]
+    tail_sq = prefix_sq[last_block, n_tail]
+    delta = shifts[last_block] - shifts[first_block]
+    sums += tail + n_tail * delta
+    sums_sq += tail_sq + 2 * delta * tail + n_tail * delta**2
+    return (shifts[first_block], sums, sums_sq)
+
+
+def apply_windows(signal: np.array, window: int, starts: np.array, reducer: Callable,
+                  block_samples:int=BLOCK_SAMPLES) -> np.array:
+    """
+    Applies a vectorized reducer to the windows of a signal starting at
+    `starts`. Windows are strided views of the signal, handed to the reducer as
+    (n_windows, window) arrays of at most `block_samples` samples so that
+    reducers copying their input stay within a bounded amount of memory.
+    signal: signal the windows are taken from
+    window: window length in samples
+    starts: start index of every window, all windows must lie inside the signal
+    reducer: callable reducing a (n_windows, window) array along axis 1
+    block_samples: number of samples of windows handed to the reducer at once
+    """
+    windows = sliding_window_view(signal, window)
+    block = max(block_samples // window, 1)
+    values = np.empty(len(starts))
+    for i in range(0, len(starts), block):
+        values[i:i+block] = reducer(windows[starts[i:i+block]])
+    return values
+
+
+def rolling_reduce(signal: np.array, window: int, stride: int, reducer:str='mean',
+                   center:bool=True, q:float=None, block_samples:int=BLOCK_SAMPLES) -> np.array:
+    """
+    Rolling statistic evaluated only at output points, equivalent to
+    `pd.Series(signal).rolling(window, center=center).<reducer>()[::stride]`
+    (NaN where the window is incomplete, std/var with ddof=1).
+    Sums, means and variances come from prefix sums (see _window_sums), so their
+    cost does not depend on the window.
+    Order statistics and short windows reduce strided views of the windows
+    (see apply_windows).
+    signal: signal to reduce
+    window: window length in samples
+    stride: samples between output points
+    reducer: one of sum, mean, var, std, min, max, median, quantile
+    center: center windows on their output point, else windows end on it
+    q: quantile in [0, 1] for the quantile reducer
+    block_samples: number of samples of windows reduced at once from strided views
+    """
+    if reducer == 'quantile' and (q is None or not 0 <= q <= 1):
+        raise ValueError(f"The quantile reducer needs q in [0, 1], not {q}")
+    signal = np.asarray(signal, dtype=float)
+    starts, valid = window_bounds(len(signal), window, stride, center)
+    out = np.full(len(starts), np.nan)
+    starts = starts[valid]
+    if not len(starts):
+        return out
+
+    if reducer in ('var', 'std') and window < 2:
+        return out
+    if reducer in CUMULATIVE_REDUCERS and window >= SHORT_WINDOW:
+        shift, sums, sums_sq = _window_sums(signal, window, starts)
+        if reducer == 'sum':
+            out[valid] = sums + shift * window
+        elif reducer == 'mean':
+            out[valid] = sums / window + shift
+        else:
+            var = np.maximum((sums_sq - sums**2 / window) / (window - 1), 0)
+            out[valid] = var if reducer == 'var' else np.sqrt(var)
+    elif reducer in WINDOW_REDUCERS:
+        out[valid] = apply_windows(
+            signal, window, starts,
+            lambda windows: WINDOW_REDUCERS[reducer](windows, q),
+            block_samples
+        )
+    else:
+        raise ValueError(f"Does not accept `{reducer}` as reducer, only "
+                         f"{', '.join(WINDOW_REDUCERS)}")
+    return out
@@ -1,39 +1,151 @@
 import numpy as np
 import pandas as pd
-import yasa
 from scipy.signal import welch
 from scipy.integrate import simpson
+from functools import partial, lru_cache
+from numpy.lib.stride_tricks import sliding_window_view
 from .Base import Base
 
 
+def median_bias(n_segments: int) -> float:
+    """
+    Bias of the median of n_segments periodograms, as in scipy's welch.
+    """
+    ii_2 = 2 * np.arange(1., (n_segments - 1) // 2 + 1)
+    return 1 + np.sum(1. / (ii_2 + 1) - 1. / ii_2)
+
+
+def median_last_axis(values: np.array) -> np.array:
+    """
+    np.median over the last axis from a single partition, skipping np.median's
+    overhead; the result is the same, NaNs are left to np.median.
+    """
+    n = values.shape[-1]
+    if np.isnan(values).any():
+        return np.median(values, axis=-1)
+    k = n // 2
+    if n % 2:
+        return np.partition(values, k, axis=-1)[..., k]
+    part = np.partition(values, [k - 1, k], axis=-1)
+    return (part[..., k - 1] + part[..., k]) / 2
+
+
+def welch_psd(epochs: np.array, fs: float, nperseg: int, noverlap: int, step:int=None) -> np.array:
+    """
+    Median-averaged Welch PSD of every row of `epochs`, as a picklable epoch kernel.
+    When consecutive epochs start `step` samples apart and `step` is a multiple
+    of the segment hop, the epochs share most of their segments: the PSD of
+    each segment of the signal they cover is computed once and every epoch
+    takes the median of the segments it spans, which gives the same result as
+    running welch on every epoch. Otherwise welch runs on every epoch.
+    epochs: 2D array with one epoch per row
+    fs: sampling frequency
+    nperseg: length of each segment
+    noverlap: number of samples of overlap between segments
+    step: samples between the starts of consecutive epochs, None if unknown
+    """
+    welch_args = dict(fs=fs, window='hann', scaling='density', average='median',
+                      nperseg=nperseg, noverlap=noverlap)
+    window = epochs.shape[1]
+    hop = int(nperseg - noverlap)
+    n_segments = int((window - noverlap) // hop)
+    if step is None or not len(epochs) or step % hop or step > window or \
+            nperseg > window or n_segments < 2:
+        return welch(x=epochs, **welch_args)[1]
+
+    # the signal covered by the epochs, then every segment of it
+    span = np.concatenate([epochs[0], epochs[1:, window - step:].ravel()])
+    segments = sliding_window_view(span, int(nperseg))[::hop]
+    # welch over a single segment is that segment's periodogram, computed as in welch itself
+    segment_psd = welch(x=segments, **welch_args)[1]
+    spanned = sliding_window_view(segment_psd, n_segments, axis=0)[::step // hop]
+    return median_last_axis(spanned) / median_bias(n_segments)
+
+
+@lru_cache(maxsize=32)
+def _band_weights(freqs: bytes, bands: tuple, freq_broad: tuple) -> np.array:
+    freqs = np.frombuffer(freqs)
+    # Simpson's rule is linear in the PSD, integrating the identity gives its weights
+    simpson_weights = lambda n, dx: simpson(np.eye(n), dx=dx, axis=-1)
+
+    # bands and their total power are integrated over the bands' range, as yasa does
+    fmin = min(min(b0, b1) for b0, b1, _ in bands)
+    fmax = max(max(b0, b1) for b0, b1, _ in bands)
+    in_range = np.flatnonzero((freqs >= fmin) & (freqs <= fmax))
+    range_freqs = freqs[in_range]
+    res = range_freqs[1] - range_freqs[0] if len(range_freqs) > 1 else freqs[1] - freqs[0]
+    weights = np.zeros((len(bands) + 2, len(freqs)))
+    for i, (b0, b1, name) in enumerate(bands):
+        in_band = in_range[(range_freqs >= b0) & (range_freqs <= b1)]
+        if len(in_band) < 2:
+            raise ValueError(f"Band {name} ({b0}-{b1} Hz) contains fewer than 2 frequency bins at a "
+                             f"frequency resolution of {res} Hz. Use a wider band or a longer window.")
+        weights[i, in_band] = simpson_weights(len(in_band), res)
+    weights[-2, in_range] = simpson_weights(len(in_range), res)
+
+    in_broad = np.flatnonzero((freqs >= freq_broad[0]) & (freqs <= freq_broad[1]))
+    if len(in_broad) < 2:
+        raise ValueError(f"Broad band ({freq_broad[0]}-{freq_broad[1]} Hz) contains fewer than 2 frequency "
+                         f"bins at a frequency resolution of {freqs[1] - freqs[0]} Hz. "
+                         "Use a wider band or a longer window.")
+    weights[-1, in_broad] = simpson_weights(len(in_broad), freqs[1] - freqs[0])
+    weights.flags.writeable = False
+    return weights
+
+
+def band_weights(freqs: np.array, bands: list[tuple[float, float, str]], freq_broad: tuple[float, float]) -> np.array:
+    """
+    (n_bands + 2, n_freqs) matrix integrating a PSD with Simpson's rule in one
+    product: a row per band, then the total power over the bands' range (the
+    divisor of yasa's relative band powers), then the power over freq_broad.
+    Cached by frequencies and band definition.
+    freqs: frequencies of the PSD
+    bands: band ranges and their name
+    freq_broad: broad range of the absolute power
+    """
+    return _band_weights(
+        np.asarray(freqs, dtype=np.float64).tobytes(),
+        tuple(tuple(band) for band in bands),
+        tuple(freq_broad)
+    )
+
+
 class SpectralDensity(Base):
     def __init__(self, epoch, window_sec:int, bands:list[tuple[float, float, str]]) -> None:
         self.from_epoch = epoch
         self.window_sec = window_sec
         self.bands = bands
-        self.welches, self.freqs, self.power_spectral_density = self.build_welch()
-        self.absolute_power = self.get_absolute_power()
+        self.welches, self.freqs, self.power_spectral_density, absolute_power = self.build_welch()
+        self.absolute_power = {"absolute_power": absolute_power}
 
-    def build_welch(self) -> tuple[np.array, np.array,]:
+    def build_welch(self) -> tuple[dict, np.array, np.array, np.array]:
         window_length = self.from_epoch.from_channel.freq*self.window_sec
         noverlap = window_length//2
         nperseg = window_length
 
-        freqs, power_spectral_density = welch(
-            x = self.from_epoch.epochs,
-            fs = self.from_epoch.from_channel.freq,
-            window ='hann',
-            scaling='density',
-            average='median',
-            nperseg=nperseg,
-            noverlap=noverlap,
+        fs = self.from_epoch.from_channel.freq
+        # blockwise, welch's segment matrix is several times larger than the epochs it is cut from
+        power_spectral_density = self.from_epoch.map_blocks(
+            partial(welch_psd, fs=fs, nperseg=nperseg, noverlap=noverlap,
+                    step=int(self.from_epoch.step_size * fs))
         )
-        bandpower = yasa.bandpower_from_psd_ndarray(power_spectral_density, freqs, bands=self.bands)
+        # welch shortens segments longer than the epochs to the epoch length
+        freqs = np.fft.rfftfreq(int(min(nperseg, self.from_epoch.epochs.shape[1])), 1 / fs)
+        weights = band_weights(freqs, self.bands, self.from_epoch.freq_broad)
+        powers = power_spectral_density @ weights.T
+        # relative band powers, as yasa.bandpower_from_psd_ndarray returns
         welches = {}
         for i, (_, _, band_name) in enumerate(self.bands):
-            welches[band_name] = bandpower[i]
-        return (welches, freqs, power_spectral_density)
+            welches[band_name] = powers[:, i] / powers[:, -2]
+        return (welches, freqs, power_spectral_density, powers[:, -1])
     
+    def release_psd(self) -> None:
+        """
+        Drops the PSD matrix, keeping the band powers and absolute power every
+        derived feature is computed from.
+        """
+        self.power_spectral_density = None
+
     def make_dataframe(self, feature: dict) -> pd.DataFrame:
         return pd.DataFrame.from_dict(
             {
@@ -53,11 +165,7 @@ class SpectralDensity(Base):
         return power_ratios
     
     def get_absolute_power(self) -> dict:
-        idx_broad = np.logical_and(self.freqs >= self.from_epoch.freq_broad[0],
-                                   self.freqs <= self.from_epoch.freq_broad[1])
-        dx = self.freqs[1] - self.freqs[0]
-        abs_power = simpson(self.power_spectral_density[:, idx_broad], dx=dx)
-        return {"absolute_power": abs_power}
+        return self.absolute_power
 
     def get_power_std(self) -> dict:
         welch_stds = {f"{k}_std": [np.std(array)] * len(array) for k, array in self.welches.items()}
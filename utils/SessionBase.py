@@ -2,10 +2,12 @@ import streamlit as st
 from streamlit.runtime.uploaded_file_manager import UploadedFile
 import pandas as pd
 import os
+import shutil
+import hashlib
 import json
 from utils.StringUtils import StringUtils
 from utils.GeneralUtils import GeneralUtils
-from config.meta import ANALYSIS_STORE
+from config.meta import ANALYSIS_STORE, UPLOAD_BLOCK_BYTES
 
 
 class SessionBase(StringUtils, GeneralUtils):
@@ -99,8 +101,9 @@ class SessionBase(StringUtils, GeneralUtils):
     def write_edf(file: UploadedFile, parent_dir) -> None:
         """
         Take the EDF file in the form streamlit's UploadedFile object (return type of
-        st.file_uploader), read it into bytes, then write to disk under the configurable
-        `ANALYSIS_STORE`/`ANALYSIS` path.
+        st.file_uploader) and stream it to disk in `UPLOAD_BLOCK_BYTES` blocks under the
+        configurable `ANALYSIS_STORE`/`ANALYSIS` path, hashing it along the way. If an
+        identical EDF already exists in another analysis, it is hardlinked instead.
         """
         session_dir = f'{ANALYSIS_STORE}/{parent_dir}'
         if parent_dir not in os.listdir(ANALYSIS_STORE):
@@ -109,11 +112,51 @@ class SessionBase(StringUtils, GeneralUtils):
         existing_file = SessionBase.get_edf_from_analysis(parent_dir)
         if existing_file is not None:
             os.remove(f"{ANALYSIS_STORE}/{parent_dir}/{existing_file}")
+            for sidecar in ('index.json', 'sha256'):
+                sidecar_file = f"{ANALYSIS_STORE}/{parent_dir}/{existing_file}.{sidecar}"
+                if os.path.exists(sidecar_file):
+                    os.remove(sidecar_file)
+            for cache_dir in ('columnar', 'filter_cache', 'rpeaks', 'rpeak_checkpoints'):
+                shutil.rmtree(f"{ANALYSIS_STORE}/{parent_dir}/{cache_dir}", ignore_errors=True)
 
-        file_bytes = file.read()
         file_write_path = f'{session_dir}/{file.name}'
-        with open(file_write_path, 'wb') as f:
-            f.write(file_bytes)
+        partial_path = f'{file_write_path}.part'
+        sha256 = hashlib.sha256()
+        file.seek(0)
+        with open(partial_path, 'wb') as f:
+            while block := file.read(UPLOAD_BLOCK_BYTES):
+                sha256.update(block)
+                f.write(block)
+        digest = sha256.hexdigest()
+
+        duplicate = SessionBase.find_edf_by_hash(digest, exclude=parent_dir)
+        if duplicate is not None:
+            os.remove(partial_path)
+            try:
+                os.link(duplicate, file_write_path)
+            except OSError:
+                # e.g. filesystems without hardlinks
+                shutil.copyfile(duplicate, file_write_path)
+        else:
+            os.replace(partial_path, file_write_path)
+        with open(f'{file_write_path}.sha256', 'w') as f:
+            f.write(digest)
+
+    @staticmethod
+    def find_edf_by_hash(digest: str, exclude: str=None) -> str | None:
+        """
+        Search the other analyses for an EDF whose recorded SHA-256 matches `digest`.
+        """
+        for analysis in SessionBase.get_existing_analyses():
+            if analysis == exclude:
+                continue
+            path = SessionBase.get_edf_from_analysis(analysis, path=True)
+            if path is None or not os.path.exists(f'{path}.sha256'):
+                continue
+            with open(f'{path}.sha256') as f:
+                if f.read().strip() == digest:
+                    return path
+        return None
 
     @staticmethod
     def write_configuration(config: dict, analysis, name) -> None: